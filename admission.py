@@ -0,0 +1,158 @@
+"""
+Admission control for password-hashing endpoints.
+
+Signin, signup and password reset each spend hundreds of milliseconds of
+bcrypt CPU. Without a limit a burst queues that work without bound and every
+endpoint slows down with it. An AdmissionController lets a fixed number of
+these requests run at once and keeps a bounded FIFO queue behind them. A
+request is rejected with 503 and Retry-After straight away when the queue is
+full or when its expected wait, estimated from recent service times, exceeds
+the queue budget, and when it has waited the whole budget without a slot.
+Cheap endpoints never pass through it.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+
+import hashing
+import logs
+import metrics
+
+load_dotenv()
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "0")) or hashing.HASH_WORKERS * 2
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "0")) or ADMISSION_MAX_CONCURRENT * 8
+ADMISSION_QUEUE_BUDGET_MS = float(os.getenv("ADMISSION_QUEUE_BUDGET_MS", "2000"))
+
+# Starting service time estimate, roughly one bcrypt round at the default cost
+INITIAL_SERVICE_SECONDS = 0.25
+# Weight of the newest sample in the service time moving average
+SERVICE_TIME_WEIGHT = 0.2
+
+admission_wait = metrics.Histogram(
+    "admission_wait_seconds", "Time admitted requests spent queued", ("controller",)
+)
+
+class AdmissionController:
+    """Concurrency limit with a bounded, deadline-aware wait queue."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_budget: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_budget = queue_budget
+        self.in_flight = 0
+        self.service_time = INITIAL_SERVICE_SECONDS
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "timeout": 0}
+        self._waiters: deque = deque()
+
+    def estimated_wait(self) -> float:
+        """Expected queueing time for a request arriving now."""
+        return (len(self._waiters) + 1) * self.service_time / self.max_concurrent
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        logs.set_outcome("shed")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def _acquire(self):
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            return
+        estimate = self.estimated_wait()
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full", estimate)
+        if estimate > self.queue_budget:
+            self._reject("deadline", estimate)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_budget)
+        except asyncio.TimeoutError:
+            self._reject("timeout", self.estimated_wait())
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        admission_wait.observe(self.name, value=time.perf_counter() - start)
+
+    def _release(self):
+        # Hand the slot straight to the oldest waiter still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot for the duration of the block, or raise 503."""
+        await self._acquire()
+        self.admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.service_time += SERVICE_TIME_WEIGHT * (elapsed - self.service_time)
+            self._release()
+
+    def stats(self) -> dict:
+        """Return limits, current load and rejection counters."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_budget_seconds": self.queue_budget,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "service_time_seconds": self.service_time,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+password_admission = AdmissionController(
+    "password", ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_BUDGET_MS / 1000
+)
+
+async def password_endpoint():
+    """Route dependency admitting a request to a password-hashing endpoint."""
+    if not ADMISSION_CONTROL:
+        yield
+        return
+    async with password_admission.slot():
+        yield
+
+metrics.CallbackMetric(
+    "admission_in_flight", "Requests holding an admission slot", "gauge", ("controller",),
+    lambda: [((password_admission.name,), password_admission.in_flight)],
+)
+metrics.CallbackMetric(
+    "admission_queued", "Requests waiting for an admission slot", "gauge", ("controller",),
+    lambda: [((password_admission.name,), len(password_admission._waiters))],
+)
+metrics.CallbackMetric(
+    "admission_rejected_total", "Requests shed by admission control", "counter", ("controller", "reason"),
+    lambda: [((password_admission.name, reason), count) for reason, count in password_admission.rejected.items()],
+)
@@ -1,35 +1,82 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
 import os
 import secrets
-import smtplib
+import time
+import uuid
 from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Dict, List, Optional
 
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 
-from database import supabase
+import hashing
+import jwt_keys
+import logs
+import mailer
+import metrics
+import repository
+import revocation
+import shared_state
+from cache import TTLCache
+from singleflight import SingleFlight
 
 load_dotenv()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 # JWT settings
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+SECRET_KEY = jwt_keys.SECRET_KEY
+ALGORITHM = jwt_keys.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# Password reset settings. "database" stores each token in password_resets;
+# "stateless" signs the token instead, so issuing and checking it needs no writes.
+RESET_TOKEN_MODE = os.getenv("RESET_TOKEN_MODE", "database")
+RESET_TOKEN_SECRET = os.getenv("RESET_TOKEN_SECRET", "")
+RESET_TOKEN_EXPIRE = timedelta(hours=1)
+
+# User record cache
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+# How long past expiry /me may serve a cached record while the database is down
+USER_CACHE_STALE_SECONDS = float(os.getenv("USER_CACHE_STALE_SECONDS", "0"))
+
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS, USER_CACHE_STALE_SECONDS)
+
+# Decoded JWT claims, keyed by token digest and expiring with the token
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+token_cache = TTLCache(TOKEN_CACHE_MAX_ENTRIES, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+# Concurrent lookups for the same key share one database call
+user_lookups = SingleFlight("users")
+reset_token_lookups = SingleFlight("password_resets")
+
+# Background rehashes of stale password hashes, by email
+_hash_upgrades: Dict[str, asyncio.Task] = {}
+
+metrics.register_cache("users", user_cache)
+metrics.register_cache("tokens", token_cache)
+metrics.register_singleflight("users", user_lookups)
+metrics.register_singleflight("password_resets", reset_token_lookups)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return await hashing.verify_password(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash a password."""
-    return pwd_context.hash(password)
+    return await hashing.hash_password(password)
+
+class UserAlreadyExistsError(Exception):
+    """Raised by create_user when the email is already registered."""
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
@@ -39,70 +86,308 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # A unique id and a millisecond issue time let the token be revoked before it expires
+    to_encode.update({"exp": expire, "iat": int(time.time() * 1000) / 1000, "jti": uuid.uuid4().hex})
+    kid, key = jwt_keys.signing_key()
+    with metrics.jwt_duration.time("encode"):
+        encoded_jwt = jwt.encode(
+            to_encode, key, algorithm=ALGORITHM, headers={"kid": kid} if kid else None
+        )
     return encoded_jwt
 
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _decode_and_cache(token: str, cache_key: bytes, key) -> Optional[dict]:
+    """Verify a token against a resolved key and cache its claims."""
+    if key is None:
+        return None
+    try:
+        with metrics.jwt_duration.time("decode"):
+            payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    exp = payload.get("exp")
+    if exp is not None:
+        token_cache.set(cache_key, payload, ttl=min(exp - time.time(), token_cache.ttl))
+    return payload
+
+def decode_token(token: str) -> Optional[dict]:
+    """Verify a JWT token and return its claims, using the token cache and denylist."""
+    cache_key = _token_cache_key(token)
+    payload = token_cache.get(cache_key)
+    if payload is None:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except JWTError:
+            return None
+        payload = _decode_and_cache(token, cache_key, jwt_keys.get_key_ring().key_for(kid))
+    if payload is None or revocation.denylist.is_revoked(payload):
+        return None
+    logs.set_user(payload.get("sub"))
+    return payload
+
+def decode_tokens(tokens: List[str]) -> List[Optional[dict]]:
+    """
+    Verify a batch of JWT tokens and return their claims in order.
+
+    Each distinct token is checked once and each kid is resolved once, so
+    duplicates and tokens sharing a signing key cost a single lookup.
+    """
+    ring = jwt_keys.get_key_ring()
+    keys = {}
+    decoded = {}
+    for token in tokens:
+        if token in decoded:
+            continue
+        cache_key = _token_cache_key(token)
+        payload = token_cache.get(cache_key)
+        if payload is None:
+            try:
+                kid = jwt.get_unverified_header(token).get("kid")
+            except JWTError:
+                decoded[token] = None
+                continue
+            if kid not in keys:
+                keys[kid] = ring.key_for(kid)
+            payload = _decode_and_cache(token, cache_key, keys[kid])
+        if payload is not None and revocation.denylist.is_revoked(payload):
+            payload = None
+        decoded[token] = payload
+    return [decoded[token] for token in tokens]
+
 def verify_token(token: str) -> Optional[str]:
     """Verify a JWT token and return the email."""
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    return email
+
+def _invalidate_local_user(email: str):
+    user_cache.invalidate(email)
+    user_lookups.forget(email)
+
+def invalidate_cached_user(email: str):
+    """Drop a cached user record, in every worker, so the next lookup reads the database."""
+    _invalidate_local_user(email)
+    shared_state.client.publish("user_cache", email)
+
+shared_state.client.subscribe("user_cache", _invalidate_local_user)
+
+def cache_user(user: dict):
+    """
+    Store a freshly written user record in the cache.
+
+    Call only once the write has committed: the invalidation fences out
+    lookups that read the row before the write, here and in other workers.
+    """
+    invalidate_cached_user(user["email"])
+    user_cache.set(user["email"], user)
+
+def _hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def issue_refresh_token(email: str, family_id: Optional[str] = None) -> Optional[str]:
+    """Create and store a refresh token, starting a new family unless one is given."""
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
-    except JWTError:
+        stored = await repository.insert_refresh_token({
+            "token_hash": _hash_refresh_token(token),
+            "family_id": family_id or str(uuid.uuid4()),
+            "email": email,
+            "expires_at": expires_at.isoformat(),
+        })
+        return token if stored else None
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error issuing refresh token")
         return None
 
-def get_user_by_email(email: str):
-    """Get user from database by email."""
+async def rotate_refresh_token(token: str):
+    """
+    Exchange a refresh token for a new one and return (email, new_token).
+
+    Returns None for unknown, expired or revoked tokens. Presenting a token
+    that was already rotated means it leaked, so its whole family is revoked.
+    """
+    token_hash = _hash_refresh_token(token)
     try:
-        response = supabase.table("users").select("*").eq("email", email).execute()
-        if response.data:
-            return response.data[0]
+        record = await repository.claim_refresh_token(token_hash)
+        if not record:
+            reused = await repository.fetch_refresh_token(token_hash)
+            if reused and reused["used"] and not reused["revoked"]:
+                logger.warning("Refresh token reuse detected; revoking family", extra={"user": reused["email"]})
+                await repository.revoke_refresh_token_family(reused["family_id"])
+            return None
+
+        expires_at = datetime.fromisoformat(record["expires_at"].replace('Z', '+00:00'))
+        if datetime.utcnow().replace(tzinfo=expires_at.tzinfo) > expires_at:
+            return None
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error rotating refresh token")
         return None
-    except Exception as e:
-        print(f"Error getting user: {e}")
+
+    new_token = await issue_refresh_token(record["email"], record["family_id"])
+    if not new_token:
         return None
+    return record["email"], new_token
 
-def create_user(email: str, password: str, first_name: str, last_name: str):
-    """Create a new user in the database."""
+async def revoke_refresh_tokens(email: str):
+    """Revoke every refresh token issued to a user."""
     try:
-        hashed_password = get_password_hash(password)
-        user_data = {
-            "email": email,
-            "password_hash": hashed_password,
-            "first_name": first_name,
-            "last_name": last_name,
-            "is_verified": False,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        response = supabase.table("users").insert(user_data).execute()
-        if response.data:
-            return response.data[0]
+        await repository.revoke_refresh_tokens_for_email(email)
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error revoking refresh tokens")
+
+async def revoke_refresh_token(token: str, email: str):
+    """Revoke the family of a refresh token, if it belongs to `email`."""
+    try:
+        record = await repository.fetch_refresh_token(_hash_refresh_token(token))
+        if record and record["email"] == email:
+            await repository.revoke_refresh_token_family(record["family_id"])
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error revoking refresh token")
+
+async def revoke_access_token(payload: dict) -> bool:
+    """Revoke a single access token, given its verified claims."""
+    try:
+        return await revocation.revoke_token(payload)
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error revoking access token")
+        return False
+
+async def revoke_all_sessions(email: str) -> bool:
+    """Revoke every access and refresh token issued to a user."""
+    try:
+        await revocation.revoke_user(email, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error revoking access tokens")
+        return False
+    await revoke_refresh_tokens(email)
+    return True
+
+async def _load_user(email: str):
+    """Fetch a user from the database and fill the cache."""
+    generation = user_cache.generation
+    user = await repository.fetch_user_by_email(email)
+    if user:
+        user_cache.set(email, user, generation=generation)
+    return user
+
+async def get_user_by_email(email: str, allow_stale: bool = False):
+    """
+    Get user from database by email.
+
+    With `allow_stale`, a cached record that expired less than
+    USER_CACHE_STALE_SECONDS ago is returned while the database is unavailable.
+    """
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+    try:
+        return await user_lookups.do(email, _load_user, email)
+    except repository.DatabaseUnavailableError:
+        user = user_cache.get_stale(email) if allow_stale else None
+        if user is None:
+            raise
+        return user
+    except Exception:
+        logger.exception("Error getting user")
         return None
-    except Exception as e:
-        print(f"Error creating user: {e}")
+
+def new_user_row(email: str, password_hash: str, first_name: str, last_name: str,
+                 is_verified: bool = False) -> dict:
+    """Build the users row for a new account."""
+    return {
+        "email": email,
+        "password_hash": password_hash,
+        "first_name": first_name,
+        "last_name": last_name,
+        "is_verified": is_verified,
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+async def create_user(email: str, password: str, first_name: str, last_name: str):
+    """
+    Create a new user in the database.
+
+    The insert itself detects duplicates through the unique email constraint,
+    so there is no separate existence check; UserAlreadyExistsError is raised
+    when the email is taken.
+    """
+    if user_cache.get(email) is not None:
+        # Known account: skip the hash and the round trip
+        raise UserAlreadyExistsError(email)
+    hashed_password = await get_password_hash(password)
+    try:
+        user_data = new_user_row(email, hashed_password, first_name, last_name)
+        user = await repository.insert_user(user_data)
+        if user:
+            cache_user(user)
+        return user
+    except repository.DuplicateRecordError:
+        raise UserAlreadyExistsError(email)
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error creating user")
         return None
 
-def authenticate_user(email: str, password: str):
+async def _upgrade_password_hash(user: dict, password: str):
+    """Rehash a password with the current scheme and cost, unless it changed meanwhile."""
+    try:
+        new_hash = await get_password_hash(password)
+        updated = await repository.update_user(
+            user["email"], {"password_hash": new_hash}, match={"password_hash": user["password_hash"]}
+        )
+        if updated:
+            cache_user(updated)
+    except Exception:
+        logger.exception("Error upgrading password hash")
+
+def _schedule_hash_upgrade(user: dict, password: str):
+    """Upgrade a stale hash in the background, once per user at a time."""
+    email = user["email"]
+    if email in _hash_upgrades:
+        return
+    task = asyncio.create_task(_upgrade_password_hash(user, password))
+    _hash_upgrades[email] = task
+    task.add_done_callback(lambda _: _hash_upgrades.pop(email, None))
+
+async def authenticate_user(email: str, password: str):
     """Authenticate a user with email and password."""
-    user = get_user_by_email(email)
-    if not user:
-        return False
-    if not verify_password(password, user["password_hash"]):
+    logs.set_user(email)
+    user = await get_user_by_email(email)
+    if not user or not await verify_password(password, user["password_hash"]):
+        logs.set_outcome("invalid_credentials")
         return False
+    if hashing.needs_update(user["password_hash"]):
+        _schedule_hash_upgrade(user, password)
     return user
 
 def generate_reset_token() -> str:
     """Generate a secure reset token."""
     return secrets.token_urlsafe(32)
 
-def store_reset_token(email: str, token: str):
+async def store_reset_token(email: str, token: str):
     """Store password reset token in database."""
     try:
-        expires_at = datetime.utcnow() + timedelta(hours=1)  # Token expires in 1 hour
+        expires_at = datetime.utcnow() + RESET_TOKEN_EXPIRE
         reset_data = {
             "email": email,
             "token": token,
@@ -111,99 +396,173 @@ def store_reset_token(email: str, token: str):
         }
         
         # First, delete any existing tokens for this email
-        supabase.table("password_resets").delete().eq("email", email).execute()
+        await repository.delete_reset_tokens(email)
         
         # Insert new token
-        response = supabase.table("password_resets").insert(reset_data).execute()
-        return response.data[0] if response.data else None
-    except Exception as e:
-        print(f"Error storing reset token: {e}")
+        return await repository.insert_reset_token(reset_data)
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error storing reset token")
+        return None
+
+def _password_fingerprint(password_hash: str) -> str:
+    """Short digest of a password hash; it changes whenever the password does."""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:32]
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def check_reset_token_secret():
+    """Raise ValueError when stateless reset tokens have no secret to be signed with."""
+    if RESET_TOKEN_MODE == "stateless" and not RESET_TOKEN_SECRET:
+        raise ValueError(
+            "RESET_TOKEN_MODE=stateless needs RESET_TOKEN_SECRET; "
+            "generate one with `python -c \"import secrets; print(secrets.token_urlsafe(32))\"`"
+        )
+
+def _reset_signature(payload: str) -> str:
+    digest = hmac.new(RESET_TOKEN_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+def create_stateless_reset_token(user: dict) -> str:
+    """
+    Sign a reset token carrying the email, expiry and password fingerprint.
+
+    Binding the token to the current password hash makes it single-use: once
+    the password changes, the fingerprint no longer matches.
+    """
+    expires_at = datetime.utcnow() + RESET_TOKEN_EXPIRE
+    claims = {
+        "sub": user["email"],
+        "exp": int(expires_at.timestamp()),
+        "fp": _password_fingerprint(user["password_hash"]),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_reset_signature(payload)}"
+
+def _decode_stateless_reset_token(token: str) -> Optional[dict]:
+    """Check a stateless reset token's signature and expiry and return its claims."""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _reset_signature(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < datetime.utcnow().timestamp():
+        return None
+    return claims
+
+async def _verify_stateless_reset_token(token: str) -> Optional[dict]:
+    """Return the user a stateless reset token was issued for, if still valid."""
+    claims = _decode_stateless_reset_token(token)
+    if not claims:
+        return None
+    user = await get_user_by_email(claims["sub"])
+    if not user or not hmac.compare_digest(
+        claims["fp"], _password_fingerprint(user["password_hash"])
+    ):
+        return None
+    return user
+
+async def issue_reset_token(user: dict) -> Optional[str]:
+    """Create a password reset token for a user, storing it unless stateless."""
+    if RESET_TOKEN_MODE == "stateless":
+        return create_stateless_reset_token(user)
+    reset_token = generate_reset_token()
+    if not await store_reset_token(user["email"], reset_token):
         return None
+    return reset_token
 
-def verify_reset_token(token: str) -> Optional[str]:
+async def verify_reset_token(token: str) -> Optional[str]:
     """Verify password reset token and return email if valid."""
+    if RESET_TOKEN_MODE == "stateless":
+        user = await _verify_stateless_reset_token(token)
+        return user["email"] if user else None
     try:
-        response = supabase.table("password_resets").select("*").eq("token", token).eq("used", False).execute()
+        reset_record = await reset_token_lookups.do(
+            token, repository.fetch_unused_reset_token, token
+        )
         
-        if not response.data:
+        if not reset_record:
             return None
             
-        reset_record = response.data[0]
         expires_at = datetime.fromisoformat(reset_record["expires_at"].replace('Z', '+00:00'))
         
         if datetime.utcnow().replace(tzinfo=expires_at.tzinfo) > expires_at:
             return None
             
         return reset_record["email"]
-    except Exception as e:
-        print(f"Error verifying reset token: {e}")
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error verifying reset token")
         return None
 
-def mark_reset_token_used(token: str):
+async def mark_reset_token_used(token: str):
     """Mark reset token as used."""
+    if RESET_TOKEN_MODE == "stateless":
+        # The password change already invalidated the token's fingerprint
+        return
     try:
-        supabase.table("password_resets").update({"used": True}).eq("token", token).execute()
-    except Exception as e:
-        print(f"Error marking token as used: {e}")
+        await repository.mark_reset_token_used(token)
+    except repository.DatabaseUnavailableError:
+        raise
+    except Exception:
+        logger.exception("Error marking token as used")
 
-def update_user_password(email: str, new_password: str):
-    """Update user password."""
+async def update_user_password(email: str, new_password: str, reset_token: Optional[str] = None):
+    """
+    Update user password.
+
+    With a stateless reset token, the update only applies while the stored
+    hash is still the one the token was issued against, so a token cannot be
+    replayed even by concurrent requests.
+    """
+    match = None
+    if reset_token and RESET_TOKEN_MODE == "stateless":
+        user = await _verify_stateless_reset_token(reset_token)
+        if not user or user["email"] != email:
+            return None
+        match = {"password_hash": user["password_hash"]}
+    hashed_password = await get_password_hash(new_password)
     try:
-        hashed_password = get_password_hash(new_password)
-        response = supabase.table("users").update({"password_hash": hashed_password}).eq("email", email).execute()
-        return response.data[0] if response.data else None
-    except Exception as e:
-        print(f"Error updating password: {e}")
+        user = await repository.update_user(email, {"password_hash": hashed_password}, match)
+        if user:
+            cache_user(user)
+        return user
+    except repository.DatabaseUnavailableError:
+        # The update may have committed before the connection failed
+        invalidate_cached_user(email)
+        raise
+    except Exception:
+        logger.exception("Error updating password")
         return None
 
 def send_reset_email(email: str, reset_token: str):
-    """Send password reset email."""
-    try:
-        smtp_host = os.getenv("SMTP_HOST")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_password = os.getenv("SMTP_PASSWORD")
-        frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-        
-        if not all([smtp_host, smtp_user, smtp_password]):
-            print("SMTP configuration not complete")
-            return False
-        
-        # Create reset URL
-        reset_url = f"{frontend_url}/reset-password?token={reset_token}"
-        
-        # Create email message
-        msg = MIMEMultipart()
-        msg['From'] = smtp_user
-        msg['To'] = email
-        msg['Subject'] = "Password Reset Request"
-        
-        body = f"""
-        Hello,
-        
-        You have requested to reset your password. Please click the link below to reset your password:
-        
-        {reset_url}
-        
-        This link will expire in 1 hour.
-        
-        If you did not request this password reset, please ignore this email.
-        
-        Best regards,
-        Your App Team
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        server = smtplib.SMTP(smtp_host, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        text = msg.as_string()
-        server.sendmail(smtp_user, email, text)
-        server.quit()
-        
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+    """Queue a password reset email for background delivery."""
+    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
+    
+    # Create reset URL
+    reset_url = f"{frontend_url}/reset-password?token={reset_token}"
+    
+    body = f"""
+    Hello,
+    
+    You have requested to reset your password. Please click the link below to reset your password:
+    
+    {reset_url}
+    
+    This link will expire in 1 hour.
+    
+    If you did not request this password reset, please ignore this email.
+    
+    Best regards,
+    Your App Team
+    """
+    
+    return mailer.outbox.enqueue(email, "Password Reset Request", body)
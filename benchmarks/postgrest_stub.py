@@ -0,0 +1,189 @@
+"""
+In-process PostgREST stand-in.
+
+PostgRESTStub is an httpx transport that serves the subset of PostgREST the
+repository module uses (eq/gt/lt/is filters, or/and logic trees, select,
+order, limit, inserts with on_conflict, updates and deletes) from in-memory
+tables, after sleeping for a configurable latency to mimic the network.
+"""
+import asyncio
+import json
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+UNIQUE_COLUMNS = {
+    "users": "email",
+    "password_resets": "token",
+    "refresh_tokens": "token_hash",
+}
+# Tables whose id is a BIGSERIAL rather than a UUID
+SERIAL_TABLES = {"token_revocations"}
+DEFAULTS = {
+    "users": {"is_verified": False},
+    "password_resets": {"used": False},
+    "refresh_tokens": {"used": False, "revoked": False},
+}
+RESERVED_PARAMS = {"select", "order", "limit", "on_conflict", "columns"}
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+def _compare(row: dict, column: str, operator: str, value: str) -> bool:
+    value = value.strip('"')
+    actual = row.get(column)
+    if operator == "is":
+        return actual is None if value == "null" else str(actual).lower() == value
+    if actual is None:
+        return False
+    if isinstance(actual, int) and not isinstance(actual, bool):
+        value = int(value)
+    else:
+        actual = str(actual).lower() if isinstance(actual, bool) else str(actual)
+    if operator == "eq":
+        return actual == value
+    if operator == "neq":
+        return actual != value
+    if operator == "gt":
+        return actual > value
+    if operator == "gte":
+        return actual >= value
+    if operator == "lt":
+        return actual < value
+    if operator == "lte":
+        return actual <= value
+    raise ValueError(f"Unsupported operator {operator}")
+
+def _logic(row: dict, kind: str, body: str) -> bool:
+    results = []
+    for condition in _split_top_level(body[1:-1]):
+        if condition.startswith(("and(", "or(")):
+            nested_kind, _, nested = condition.partition("(")
+            results.append(_logic(row, nested_kind, "(" + nested))
+        else:
+            column, operator, value = condition.split(".", 2)
+            results.append(_compare(row, column, operator, value))
+    return all(results) if kind == "and" else any(results)
+
+def _matches(row: dict, params: httpx.QueryParams) -> bool:
+    for key, value in params.multi_items():
+        if key in RESERVED_PARAMS:
+            continue
+        if key in ("or", "and"):
+            if not _logic(row, key, value):
+                return False
+            continue
+        operator, _, operand = value.partition(".")
+        if not _compare(row, key, operator, operand):
+            return False
+    return True
+
+class PostgRESTStub(httpx.AsyncBaseTransport):
+    """httpx transport answering PostgREST requests from in-memory tables."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tables: Dict[str, List[dict]] = {}
+        self.requests = 0
+
+    def seed(self, table: str, rows: List[dict]):
+        for row in rows:
+            self._insert_row(table, dict(row))
+
+    def _insert_row(self, table: str, row: dict) -> dict:
+        record = dict(DEFAULTS.get(table, {}))
+        record.update(row)
+        now = datetime.now(timezone.utc).isoformat()
+        rows = self.tables.setdefault(table, [])
+        record.setdefault("id", len(rows) + 1 if table in SERIAL_TABLES else str(uuid.uuid4()))
+        record.setdefault("created_at", now)
+        record.setdefault("updated_at", now)
+        rows.append(record)
+        return record
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency_ms or self.jitter_ms:
+            delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+            await asyncio.sleep(max(delay, 0) / 1000)
+
+        table = request.url.path.rsplit("/", 1)[-1]
+        params = request.url.params
+        rows = self.tables.setdefault(table, [])
+        handler = getattr(self, f"_{request.method.lower()}", None)
+        if handler is None:
+            return httpx.Response(405)
+        return handler(table, rows, params, request)
+
+    def _project(self, rows: List[dict], params: httpx.QueryParams) -> List[dict]:
+        select = params.get("select", "*")
+        if select == "*":
+            return [dict(row) for row in rows]
+        columns = select.split(",")
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    def _get(self, table, rows, params, request):
+        found = [row for row in rows if _matches(row, params)]
+        if "order" in params:
+            for term in reversed(params["order"].split(",")):
+                column, _, direction = term.partition(".")
+                found.sort(key=lambda row: str(row.get(column)), reverse=direction == "desc")
+        if "limit" in params:
+            found = found[: int(params["limit"])]
+        return httpx.Response(200, json=self._project(found, params))
+
+    def _post(self, table, rows, params, request):
+        body = json.loads(request.content)
+        items = body if isinstance(body, list) else [body]
+        ignore_duplicates = "ignore-duplicates" in request.headers.get("prefer", "")
+        unique = UNIQUE_COLUMNS.get(table)
+        existing = {row.get(unique) for row in rows} if unique else set()
+        created = []
+        for item in items:
+            if unique and item.get(unique) in existing:
+                if ignore_duplicates:
+                    continue
+                return httpx.Response(409, json={
+                    "code": "23505",
+                    "message": f'duplicate key value violates unique constraint "{table}_{unique}_key"',
+                })
+            created.append(self._insert_row(table, item))
+            if unique:
+                existing.add(item.get(unique))
+        return httpx.Response(201, json=self._project(created, params))
+
+    def _patch(self, table, rows, params, request):
+        values = json.loads(request.content)
+        updated = []
+        for row in rows:
+            if _matches(row, params):
+                row.update(values)
+                row["updated_at"] = datetime.now(timezone.utc).isoformat()
+                updated.append(row)
+        return httpx.Response(200, json=self._project(updated, params))
+
+    def _delete(self, table, rows, params, request):
+        rows[:] = [row for row in rows if not _matches(row, params)]
+        return httpx.Response(204)
+
+    def _head(self, table, rows, params, request):
+        return httpx.Response(200)
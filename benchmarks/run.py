@@ -0,0 +1,239 @@
+"""
+Load-test benchmarks.
+
+Runs the FastAPI app in-process against the PostgREST stand-in and drives
+each auth endpoint with concurrent async clients, reporting latency
+percentiles and throughput.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --latency-ms 20 --concurrency 64 --requests 1000
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+--compare exits non-zero when an endpoint's p95 latency rises, or its
+throughput falls, by more than --threshold percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+# The app reads its configuration at import time
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.stub")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+os.environ.setdefault("SMTP_HOST", "smtp.stub")
+os.environ.setdefault("SMTP_FROM", "benchmark@example.com")
+# Measure raw throughput rather than how much load is shed or throttled
+os.environ.setdefault("ADMISSION_CONTROL", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# Keep per-request access logs out of the report
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+import auth_utils
+import database
+import hashing
+import mailer
+import main
+from benchmarks.postgrest_stub import PostgRESTStub
+
+ENDPOINTS = ["signup", "signin", "me", "verify-token", "forgot-password", "reset-password"]
+BENCH_PASSWORD = "benchmark-password"
+# Endpoints whose requests can be repeated, so a warm-up call is harmless
+WARMUP_ENDPOINTS = {"signin", "me", "verify-token", "forgot-password"}
+
+class NullSMTPConnection(mailer.SMTPConnection):
+    """Accepts every message without touching the network."""
+
+    def send(self, message):
+        pass
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def seed(stub: PostgRESTStub, users: int, requests: int) -> Dict[str, list]:
+    """Create accounts, access tokens and reset tokens for the scenarios."""
+    password_hash = hashing.pwd_context.hash(BENCH_PASSWORD)
+    emails = [f"bench-{i}@example.com" for i in range(users)]
+    stub.seed("users", [
+        {"email": email, "password_hash": password_hash, "first_name": "Bench",
+         "last_name": "User", "is_verified": True}
+        for email in emails
+    ])
+
+    expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    reset_emails = [f"bench-reset-{i}@example.com" for i in range(requests)]
+    stub.seed("users", [
+        {"email": email, "password_hash": password_hash, "first_name": "Bench",
+         "last_name": "Reset"}
+        for email in reset_emails
+    ])
+    reset_tokens = [f"bench-reset-token-{i}" for i in range(requests)]
+    stub.seed("password_resets", [
+        {"email": email, "token": token, "expires_at": expires_at}
+        for email, token in zip(reset_emails, reset_tokens)
+    ])
+
+    access_tokens = [auth_utils.create_access_token({"sub": email}) for email in emails]
+    return {"emails": emails, "access_tokens": access_tokens, "reset_tokens": reset_tokens}
+
+def scenarios(data: Dict[str, list], run_id: str) -> Dict[str, Callable[[int], tuple]]:
+    """Map each endpoint to a function building its i-th request."""
+    emails, tokens = data["emails"], data["access_tokens"]
+
+    def bearer(i):
+        return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    return {
+        "signup": lambda i: ("POST", "/api/auth/signup", {"json": {
+            "email": f"signup-{run_id}-{i}@example.com", "password": BENCH_PASSWORD,
+            "first_name": "New", "last_name": "User"}}),
+        "signin": lambda i: ("POST", "/api/auth/signin", {"json": {
+            "email": emails[i % len(emails)], "password": BENCH_PASSWORD}}),
+        "me": lambda i: ("GET", "/api/auth/me", {"headers": bearer(i)}),
+        "verify-token": lambda i: ("POST", "/api/auth/verify-token", {"headers": bearer(i)}),
+        "forgot-password": lambda i: ("POST", "/api/auth/forgot-password", {"json": {
+            "email": emails[i % len(emails)]}}),
+        "reset-password": lambda i: ("POST", "/api/auth/reset-password", {"json": {
+            "token": data["reset_tokens"][i], "new_password": BENCH_PASSWORD}}),
+    }
+
+async def run_endpoint(client: httpx.AsyncClient, build: Callable[[int], tuple],
+                       requests: int, concurrency: int) -> dict:
+    """Issue `requests` calls from `concurrency` workers and summarise them."""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            method, url, kwargs = build(index)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+async def run(args) -> dict:
+    stub = PostgRESTStub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    database.use_transport(stub)
+    mailer.outbox.connection = NullSMTPConnection()
+
+    data = seed(stub, args.users, args.requests)
+    builders = scenarios(data, str(int(time.time())))
+
+    results = {}
+    await main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for endpoint in args.endpoints:
+                if endpoint in WARMUP_ENDPOINTS:
+                    # One request first so executor and pool start-up is not measured
+                    method, url, kwargs = builders[endpoint](0)
+                    await client.request(method, url, **kwargs)
+                results[endpoint] = await run_endpoint(
+                    client, builders[endpoint], args.requests, args.concurrency
+                )
+                print_result(endpoint, results[endpoint])
+    finally:
+        await main.app.router.shutdown()
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "hash_executor": hashing.HASH_EXECUTOR,
+            "hash_workers": hashing.HASH_WORKERS,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+        "database_requests": stub.requests,
+    }
+
+def print_result(endpoint: str, result: dict):
+    print(
+        f"{endpoint:<16} {result['rps']:>10.1f} req/s  "
+        f"p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+        f"p99 {result['p99_ms']:>9.2f} ms  errors {result['errors']}"
+    )
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print changes against a baseline; returns False on any regression."""
+    ok = True
+    print(f"\nCompared with baseline from {baseline['environment']['timestamp']}:")
+    for endpoint, result in current["results"].items():
+        before = baseline["results"].get(endpoint)
+        if not before:
+            continue
+        p95_change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0
+        rps_change = (result["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0
+        regressed = p95_change > threshold or rps_change < -threshold
+        ok = ok and not regressed
+        print(
+            f"{endpoint:<16} p95 {p95_change:+7.1f}%  req/s {rps_change:+7.1f}%"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the auth endpoints")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=100, help="Distinct seeded accounts")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Injected database latency")
+    parser.add_argument("--jitter-ms", type=float, default=1.0)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--save", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
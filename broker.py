@@ -0,0 +1,88 @@
+"""
+Shared state broker.
+
+serve.py runs a Broker in the master process on a unix socket. Workers
+connect to it through shared_state.client and exchange JSON lines:
+
+- {"id", "op": "hit", "key", "limit", "window"} is answered with
+  {"id", "result"}, the rate-limit wait in seconds (0 when allowed)
+- {"op": "publish", "channel", "data"} is forwarded to every other
+  connection as {"op": "event", "channel", "data"}
+- {"op": "metrics_push", "worker", "families"} replaces the metrics snapshot
+  kept for that connection
+- {"id", "op": "metrics"} is answered with the [worker, families] snapshots
+  of every other connection
+
+Workers inherit every module the master has imported and never reload them
+on SIGHUP, so this module imports only the standard library and
+sliding_window.py. Changes to either need a full restart.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+from sliding_window import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+# Metrics snapshots run to hundreds of kilobytes, past asyncio's 64 KiB line limit
+STREAM_LIMIT = 16 * 1024 * 1024
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+class Broker:
+    """Unix socket server holding the state every worker shares."""
+
+    def __init__(self, path: str, max_keys: int):
+        self.path = path
+        self.rate_limits = MemoryBackend(max_keys)
+        self._writers = set()
+        # writer -> [worker, families] last pushed over that connection
+        self._metrics = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=STREAM_LIMIT)
+        os.chmod(self.path, 0o600)
+
+    async def stop(self):
+        for writer in list(self._writers):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message["op"] == "hit":
+                    retry_after = await self.rate_limits.hit(
+                        message["key"], message["limit"], message["window"]
+                    )
+                    writer.write(encode({"id": message["id"], "result": retry_after}))
+                elif message["op"] == "publish":
+                    event = encode({"op": "event", "channel": message["channel"], "data": message["data"]})
+                    for other in self._writers:
+                        if other is not writer:
+                            other.write(event)
+                elif message["op"] == "metrics_push":
+                    self._metrics[writer] = [message["worker"], message["families"]]
+                elif message["op"] == "metrics":
+                    snapshots = [snapshot for other, snapshot in self._metrics.items() if other is not writer]
+                    writer.write(encode({"id": message["id"], "result": snapshots}))
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.info("Shared state connection closed: %s", e)
+        finally:
+            self._writers.discard(writer)
+            self._metrics.pop(writer, None)
+            writer.close()
@@ -0,0 +1,110 @@
+"""
+In-process caches.
+
+TTLCache is a bounded LRU map whose entries expire after a time-to-live. With
+a stale TTL, expired entries are kept that much longer for get_stale(), which
+callers use as a fallback when the source of truth is unavailable. It is not
+thread-safe; it is meant to be used from the event loop thread.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry and hit/miss counters."""
+
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it recently used, or `default`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """Return an entry that is live or expired less than `stale_ttl` ago, or `default`."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] + self.stale_ttl <= time.monotonic():
+            return default
+        self.stale_hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None,
+            generation: Optional[int] = None):
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        When `generation` is given and an invalidation happened since it was
+        read, the value may be stale and is dropped instead of stored.
+        """
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a key and fence out any fill that started before now."""
+        self.generation += 1
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry."""
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Return size, configuration and counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_hits": self.stale_hits,
+        }
@@ -0,0 +1,155 @@
+"""
+Circuit breaker for the database.
+
+While Supabase is down or timing out, every request would otherwise wait out
+its full timeout and hold a pooled connection doing so. The breaker counts
+outcomes of database calls over a sliding window of CIRCUIT_WINDOW_SECONDS
+and opens once at least CIRCUIT_MIN_REQUESTS calls were made and the share
+of failures reached CIRCUIT_ERROR_RATE. While open, calls fail at once. After
+CIRCUIT_OPEN_SECONDS a single call is let through as a probe: its success
+closes the circuit, its failure opens it again.
+
+Only failures of the database itself count: connection errors, timeouts and
+5xx responses. Requests PostgREST rejects, such as unique violations, count
+as successes.
+"""
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_BREAKER = os.getenv("CIRCUIT_BREAKER", "true").lower() == "true"
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_MIN_REQUESTS = int(os.getenv("CIRCUIT_MIN_REQUESTS", "20"))
+CIRCUIT_WINDOW_SECONDS = int(os.getenv("CIRCUIT_WINDOW_SECONDS", "10"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "5"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """A call was refused because the circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Error-rate circuit breaker with a single half-open probe."""
+
+    def __init__(self, name: str, error_rate: float, min_requests: int,
+                 window: int, open_seconds: float, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+        # [second, calls, failures], oldest first
+        self._buckets: deque = deque()
+
+    def attempt(self) -> bool:
+        """
+        Ask to make a call; raises CircuitOpenError while open.
+
+        Returns True when the call is the half-open probe. Pass the same
+        value to record() with the outcome.
+        """
+        if self.state == CLOSED:
+            return False
+        now = time.monotonic()
+        if self.state == OPEN and now >= self._opened_at + self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        raise CircuitOpenError(self.name, max(self._opened_at + self.open_seconds - now, 1))
+
+    def record(self, ok: Optional[bool], probe: bool = False):
+        """
+        Record the outcome of a call allowed by attempt().
+
+        `ok` is None when the call ended without an outcome, e.g. cancelled;
+        a probe then lets the next call probe instead.
+        """
+        if probe:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self._buckets.clear()
+            elif ok is not None:
+                self._open()
+            return
+        if ok is None or self.state != CLOSED or not self.enabled:
+            return
+        bucket = self._bucket()
+        bucket[1] += 1
+        if not ok:
+            bucket[2] += 1
+            calls = sum(b[1] for b in self._buckets)
+            failures = sum(b[2] for b in self._buckets)
+            if calls >= self.min_requests and failures >= self.error_rate * calls:
+                self._open()
+
+    def _bucket(self) -> list:
+        second = int(time.monotonic())
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        return self._buckets[-1]
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._buckets.clear()
+        logger.error("Circuit %s opened; failing fast for %gs", self.name, self.open_seconds)
+
+    def stats(self) -> dict:
+        """Return the state, configuration and counters."""
+        return {
+            "state": self.state,
+            "error_rate": self.error_rate,
+            "min_requests": self.min_requests,
+            "window_seconds": self.window,
+            "open_seconds": self.open_seconds,
+            "window_calls": sum(b[1] for b in self._buckets),
+            "window_failures": sum(b[2] for b in self._buckets),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+database_breaker = CircuitBreaker(
+    "database", CIRCUIT_ERROR_RATE, CIRCUIT_MIN_REQUESTS, CIRCUIT_WINDOW_SECONDS, CIRCUIT_OPEN_SECONDS,
+    enabled=CIRCUIT_BREAKER,
+)
+
+metrics.CallbackMetric(
+    "circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", "gauge", ("circuit",),
+    lambda: [((database_breaker.name,), (CLOSED, HALF_OPEN, OPEN).index(database_breaker.state))],
+)
+metrics.CallbackMetric(
+    "circuit_opened_total", "Times the circuit breaker opened", "counter", ("circuit",),
+    lambda: [((database_breaker.name,), database_breaker.opened)],
+)
+metrics.CallbackMetric(
+    "circuit_rejected_total", "Calls refused while the circuit was open", "counter", ("circuit",),
+    lambda: [((database_breaker.name,), database_breaker.rejected)],
+)
@@ -1,14 +1,73 @@
+import asyncio
 import os
-from supabase import create_client, Client
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Supabase configuration
+# Supabase configuration, checked when the client is first built
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_POOL_KEEPALIVE = int(os.getenv("DB_POOL_KEEPALIVE", "10"))
+DB_KEEPALIVE_EXPIRY = float(os.getenv("DB_KEEPALIVE_EXPIRY", "30"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+# Deadlines for a whole request, by kind of operation
+DB_READ_TIMEOUT = float(os.getenv("DB_READ_TIMEOUT", "2"))
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "5"))
+DB_BULK_TIMEOUT = float(os.getenv("DB_BULK_TIMEOUT", "30"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "true").lower() == "true"
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "4"))
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]):
+    """Send database traffic through a custom transport, e.g. an in-process stub."""
+    global _client, _transport
+    _transport = transport
+    _client = None
+
+def get_client() -> httpx.AsyncClient:
+    """Return the pooled PostgREST client, creating it on first use."""
+    global _client
+    if _client is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+        _client = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL.rstrip('/')}/rest/v1",
+            headers={
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+            },
+            http2=DB_HTTP2,
+            limits=httpx.Limits(
+                max_connections=DB_POOL_SIZE,
+                max_keepalive_connections=DB_POOL_KEEPALIVE,
+                keepalive_expiry=DB_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(DB_TIMEOUT, connect=DB_CONNECT_TIMEOUT),
+            transport=_transport,
+        )
+    return _client
+
+async def ping():
+    """Make a minimal request to PostgREST; raises if it is unreachable or rejects the key."""
+    response = await get_client().head("/")
+    response.raise_for_status()
+
+async def warm_up():
+    """Open pooled connections ahead of the first request."""
+    await asyncio.gather(*(ping() for _ in range(max(DB_WARMUP_CONNECTIONS, 1))))
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+async def close_client():
+    """Close the pooled client and its connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -51,7 +51,8 @@ Type=exec
 User=root
 WorkingDirectory=/var/www/backendauth
 Environment=PATH=/var/www/backendauth/venv/bin
-ExecStart=/var/www/backendauth/venv/bin/python main.py
+ExecStart=/var/www/backendauth/venv/bin/python serve.py
+ExecReload=/bin/kill -HUP $MAINPID
 Restart=always
 RestartSec=10
 
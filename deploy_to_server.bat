@@ -16,12 +16,8 @@ if exist "temp_deploy" rmdir /s /q temp_deploy
 mkdir temp_deploy
 
 REM Copy application files
-copy "main.py" temp_deploy\
-copy "schemas.py" temp_deploy\
-copy "database.py" temp_deploy\
-copy "auth_utils.py" temp_deploy\
+copy "*.py" temp_deploy\
 copy "requirements.txt" temp_deploy\
-copy "setup_database.py" temp_deploy\
 copy ".env" temp_deploy\
 copy "deploy.sh" temp_deploy\
 xcopy "routes" temp_deploy\routes\ /s /i
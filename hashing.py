@@ -0,0 +1,242 @@
+"""
+Password hashing executor.
+
+bcrypt is deliberately CPU-heavy, so hashing and verification are submitted to
+a worker pool instead of running on the event loop thread.
+
+HASH_SCHEMES lists the accepted schemes, preferred first. New hashes use the
+first scheme at the configured cost; hashes in other schemes or below that
+cost still verify, and needs_update() reports them so they can be upgraded.
+Run `python hashing.py calibrate` to pick a cost for this host.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Password hashing
+HASH_SCHEMES = [scheme.strip() for scheme in os.getenv("HASH_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+def build_context(schemes: List[str], bcrypt_rounds: int = BCRYPT_ROUNDS,
+                  argon2_time_cost: int = ARGON2_TIME_COST) -> CryptContext:
+    """Build a CryptContext hashing with schemes[0] and flagging weaker hashes as stale."""
+    settings = {}
+    if "bcrypt" in schemes:
+        settings.update(bcrypt__rounds=bcrypt_rounds, bcrypt__min_rounds=bcrypt_rounds)
+    if "argon2" in schemes:
+        # Requires the argon2-cffi package
+        settings.update(
+            argon2__rounds=argon2_time_cost,
+            argon2__min_rounds=argon2_time_cost,
+            argon2__memory_cost=ARGON2_MEMORY_COST,
+            argon2__parallelism=ARGON2_PARALLELISM,
+        )
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+pwd_context = build_context(HASH_SCHEMES)
+
+# Executor settings
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process")  # "process" or "thread"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "0")) or os.cpu_count() or 1
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "0")) or HASH_WORKERS * 8
+# Bulk hashing keeps at most this many hashes in the pool, so interactive calls
+# queue behind a single hash per worker instead of a whole import batch
+HASH_BULK_CONCURRENCY = int(os.getenv("HASH_BULK_CONCURRENCY", "0")) or max(1, HASH_WORKERS // 2)
+
+_executor: Optional[Executor] = None
+_executor_kind: Optional[str] = None
+_pending = 0
+_bulk_slots: Optional[asyncio.Semaphore] = None
+_stats = {
+    "hash": {"calls": 0, "rejected": 0, "wait_seconds": 0.0, "run_seconds": 0.0, "max_seconds": 0.0},
+    "verify": {"calls": 0, "rejected": 0, "wait_seconds": 0.0, "run_seconds": 0.0, "max_seconds": 0.0},
+}
+
+def _timed_hash(password: str):
+    """Hash a password inside a worker, returning the hash and CPU time spent."""
+    start = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    return hashed, time.perf_counter() - start
+
+def _timed_verify(plain_password: str, hashed_password: str):
+    """Verify a password inside a worker, returning the result and CPU time spent."""
+    start = time.perf_counter()
+    valid = pwd_context.verify(plain_password, hashed_password)
+    return valid, time.perf_counter() - start
+
+def _warm_worker():
+    """Load the hash backend inside a worker."""
+    pwd_context.hash("warm-up")
+
+def get_executor() -> Executor:
+    """Return the hashing executor, creating it on first use."""
+    global _executor, _executor_kind
+    if _executor is None:
+        if HASH_EXECUTOR == "process":
+            try:
+                _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+                _executor_kind = "process"
+            except (OSError, NotImplementedError) as e:
+                logger.warning("Process pool unavailable, falling back to threads: %s", e)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hashing")
+            _executor_kind = "thread"
+    return _executor
+
+def shutdown_executor():
+    """Shut down the hashing executor, waiting for in-flight work."""
+    global _executor, _executor_kind
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        _executor_kind = None
+
+async def _submit(operation: str, func, *args, shed: bool = True):
+    """
+    Run a hashing function in the executor with bounded queue depth.
+
+    With shed=False the call waits instead of being rejected when the queue
+    is full; its caller bounds its own concurrency.
+    """
+    global _pending
+    stats = _stats[operation]
+    if shed and _pending >= HASH_MAX_PENDING:
+        stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        result, run_seconds = await loop.run_in_executor(get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+    elapsed = time.perf_counter() - start
+    metrics.password_hash_duration.observe(operation, value=elapsed)
+    stats["calls"] += 1
+    stats["run_seconds"] += run_seconds
+    stats["wait_seconds"] += max(elapsed - run_seconds, 0.0)
+    stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+    return result
+
+async def warm_up():
+    """Start the workers and load the hash backend in them before the first signin."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, _warm_worker) for _ in range(HASH_WORKERS)))
+
+async def hash_password(password: str) -> str:
+    """Hash a password off the event loop."""
+    return await _submit("hash", _timed_hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash off the event loop."""
+    return await _submit("verify", _timed_verify, plain_password, hashed_password)
+
+async def _hash_bulk(password: str) -> str:
+    async with _bulk_slots:
+        return await _submit("hash", _timed_hash, password, shed=False)
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash many passwords, one task per hash and at most HASH_BULK_CONCURRENCY at a time."""
+    global _bulk_slots
+    if _bulk_slots is None:
+        _bulk_slots = asyncio.Semaphore(HASH_BULK_CONCURRENCY)
+    return list(await asyncio.gather(*(_hash_bulk(password) for password in passwords)))
+
+def is_password_hash(value: str) -> bool:
+    """Whether a value is a hash in one of the configured schemes."""
+    return pwd_context.identify(value) is not None
+
+def needs_update(hashed_password: str) -> bool:
+    """Whether a hash uses a deprecated scheme or a cost below the configured one."""
+    return pwd_context.needs_update(hashed_password)
+
+metrics.CallbackMetric(
+    "password_hash_pending", "Hash/verify calls queued or running", "gauge", (),
+    lambda: [((), _pending)],
+)
+metrics.CallbackMetric(
+    "password_hash_rejected_total", "Hash/verify calls shed because the queue was full",
+    "counter", ("operation",),
+    lambda: [((name,), values["rejected"]) for name, values in _stats.items()],
+)
+
+def get_stats() -> dict:
+    """Return executor configuration, queue depth and per-operation timings."""
+    return {
+        "executor": _executor_kind or HASH_EXECUTOR,
+        "workers": HASH_WORKERS,
+        "pending": _pending,
+        "max_pending": HASH_MAX_PENDING,
+        "bulk_concurrency": HASH_BULK_CONCURRENCY,
+        "operations": {name: dict(values) for name, values in _stats.items()},
+    }
+
+def _time_hash(context: CryptContext, samples: int) -> float:
+    """Median seconds one hash takes with a context."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def calibrate(scheme: str, target_seconds: float, samples: int = 3):
+    """
+    Return (cost, seconds) for the highest cost whose hash time stays within the target.
+
+    The cost is bcrypt rounds or the argon2 time cost.
+    """
+    cost, low = (4, 4) if scheme == "bcrypt" else (1, 1)
+    best = None
+    while True:
+        if scheme == "bcrypt":
+            context = build_context(["bcrypt"], bcrypt_rounds=cost)
+        else:
+            context = build_context(["argon2"], argon2_time_cost=cost)
+        seconds = _time_hash(context, samples)
+        print(f"  {scheme} cost {cost}: {seconds * 1000:.1f} ms")
+        if seconds > target_seconds:
+            break
+        best = (cost, seconds)
+        cost += 1
+    return best or (low, seconds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password hashing utilities")
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = commands.add_parser("calibrate", help="Pick a hash cost for this host")
+    calibrate_parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default=HASH_SCHEMES[0])
+    calibrate_parser.add_argument("--target-ms", type=float, default=250, help="Target time per hash")
+    calibrate_parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Timing {args.scheme} on this host (target {args.target_ms:.0f} ms per hash)...")
+    cost, seconds = calibrate(args.scheme, args.target_ms / 1000, args.samples)
+    setting = "BCRYPT_ROUNDS" if args.scheme == "bcrypt" else "ARGON2_TIME_COST"
+    print(f"\n{setting}={cost}")
+    print(f"~{seconds * 1000:.0f} ms per hash, ~{HASH_WORKERS / seconds:.1f} hashes/s across {HASH_WORKERS} workers")
@@ -0,0 +1,159 @@
+"""
+JWT signing key ring.
+
+With an HMAC algorithm (the HS256 default) tokens are signed with SECRET_KEY
+and nothing is published. With an asymmetric algorithm (RS256, ES256, ...)
+private keys are loaded from JWT_KEYS_DIR, one PEM file per key id:
+
+    keys/2026-01-01.pem      signing-capable key, kid "2026-01-01"
+    keys/2025-07-01.pub.pem  retired key kept only to verify live tokens
+
+The active key is JWT_ACTIVE_KID, or the last kid in sorted order, so
+date-prefixed file names rotate naturally. Every key in the ring is published
+at /.well-known/jwks.json, so tokens signed by a previous key stay valid until
+they expire as long as its file is kept around.
+
+Without a private key in JWT_KEYS_DIR the ring fails to load, and the app
+refuses to start. JWT_EPHEMERAL_KEY=true signs with a throwaway per-process
+key instead, for development only: tokens stop verifying on restart and in
+any other worker process.
+
+Generate a new key with:
+
+    python jwt_keys.py generate <kid>
+"""
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from jose import jwk
+from jose.backends.base import Key
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "3600"))
+JWT_EPHEMERAL_KEY = os.getenv("JWT_EPHEMERAL_KEY", "false").lower() == "true"
+
+class KeyRing:
+    """Signing key plus every key that may verify a live token, indexed by kid."""
+
+    def __init__(self, algorithm: str):
+        self.algorithm = algorithm
+        self.signing_kid: Optional[str] = None
+        self.signing_key: Optional[Key] = None
+        self.verification_keys: Dict[str, Key] = {}
+        self.jwks: dict = {"keys": []}
+
+    @property
+    def asymmetric(self) -> bool:
+        return not self.algorithm.startswith("HS")
+
+    def key_for(self, kid: Optional[str]) -> Optional[Key]:
+        """Return the verification key for a kid."""
+        if not self.asymmetric:
+            return self.signing_key
+        if kid is None:
+            return None
+        return self.verification_keys.get(kid)
+
+def _load_asymmetric(ring: KeyRing, keys_dir: Path):
+    private_kids = []
+    for path in sorted(keys_dir.glob("*.pem")) if keys_dir.is_dir() else []:
+        public_only = path.name.endswith(".pub.pem")
+        kid = path.name[: -len(".pub.pem")] if public_only else path.stem
+        key = jwk.construct(path.read_text(), ring.algorithm)
+        ring.verification_keys[kid] = key.public_key()
+        if not public_only:
+            private_kids.append((kid, key))
+
+    if not private_kids:
+        if not JWT_EPHEMERAL_KEY:
+            raise ValueError(
+                f"ALGORITHM={ring.algorithm} needs a private key in {keys_dir}; "
+                "create one with `python jwt_keys.py generate <kid>`"
+            )
+        logger.warning("No JWT signing keys found in %s; using an ephemeral key", keys_dir)
+        kid = "ephemeral"
+        key = jwk.construct(generate_private_key_pem(ring.algorithm), ring.algorithm)
+        ring.verification_keys[kid] = key.public_key()
+        private_kids.append((kid, key))
+
+    available = dict(private_kids)
+    ring.signing_kid = JWT_ACTIVE_KID if JWT_ACTIVE_KID in available else private_kids[-1][0]
+    ring.signing_key = available[ring.signing_kid]
+
+    for kid, key in ring.verification_keys.items():
+        entry = key.to_dict()
+        entry.update({"kid": kid, "use": "sig", "alg": ring.algorithm})
+        ring.jwks["keys"].append(entry)
+
+def load_key_ring() -> KeyRing:
+    """Build the key ring from configuration."""
+    ring = KeyRing(ALGORITHM)
+    if ring.asymmetric:
+        _load_asymmetric(ring, Path(JWT_KEYS_DIR))
+    else:
+        ring.signing_key = jwk.construct(SECRET_KEY, ALGORITHM)
+    return ring
+
+_key_ring: Optional[KeyRing] = None
+
+def get_key_ring() -> KeyRing:
+    """Return the process-wide key ring, loading it on first use."""
+    global _key_ring
+    if _key_ring is None:
+        _key_ring = load_key_ring()
+    return _key_ring
+
+def reload_key_ring() -> KeyRing:
+    """Re-read the keys directory, e.g. after adding a rotated key."""
+    global _key_ring
+    _key_ring = load_key_ring()
+    return _key_ring
+
+def signing_key() -> Tuple[Optional[str], Key]:
+    """Return the kid and key that new tokens are signed with."""
+    ring = get_key_ring()
+    return ring.signing_kid, ring.signing_key
+
+def generate_private_key_pem(algorithm: str) -> str:
+    """Generate a PEM private key suitable for an asymmetric algorithm."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm.startswith("ES"):
+        curve = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}[algorithm]
+        private_key = ec.generate_private_key(curve())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "generate":
+        print("Usage: python jwt_keys.py generate <kid>")
+        sys.exit(1)
+    if not ALGORITHM.startswith(("RS", "ES")):
+        print(f"ALGORITHM={ALGORITHM} does not use a key pair")
+        sys.exit(1)
+    keys_dir = Path(JWT_KEYS_DIR)
+    keys_dir.mkdir(parents=True, exist_ok=True)
+    path = keys_dir / f"{sys.argv[2]}.pem"
+    if path.exists():
+        print(f"{path} already exists")
+        sys.exit(1)
+    path.write_text(generate_private_key_pem(ALGORITHM))
+    path.chmod(0o600)
+    print(f"Wrote {path}; set JWT_ACTIVE_KID={sys.argv[2]} or restart to start signing with it")
@@ -0,0 +1,237 @@
+"""
+Structured, non-blocking logging.
+
+configure() routes every record through a QueueHandler: the request path only
+stamps the record with the request context and puts it on a bounded queue. A
+QueueListener thread formats records as JSON lines (LOG_FORMAT=text for
+development) and writes them to stderr. When the queue is full, records are
+dropped and counted rather than blocking the event loop.
+
+RequestLogMiddleware gives every request an id, taken from a well-formed
+X-Request-ID header or generated, and echoes it in the response. It logs one
+access record per request with method, route, status, user, outcome and
+latency. Records logged while handling the request carry the same request id,
+route and user.
+
+LOG_SAMPLE_RATES keeps only a fraction of access records at the given
+levels, e.g. "INFO=0.1" logs one in ten successful requests. Failed requests
+are logged at WARNING or ERROR, so they are kept unless those levels are
+sampled too. Sampled-out requests cost no record at all.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+def parse_sample_rates(value: str) -> Dict[int, float]:
+    """Parse "LEVEL=rate,..." into level number -> fraction of records kept."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        level, rate = item.split("=")
+        rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+# Attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_CONTEXT_FIELDS = ("request_id", "route", "user")
+
+# The current request's fields; a dict so handlers can fill in the user and outcome
+_request: ContextVar[Optional[dict]] = ContextVar("request", default=None)
+
+access_logger = logging.getLogger("access")
+
+def set_user(user: Optional[str]):
+    """Attach the authenticated user to the current request's log records."""
+    context = _request.get()
+    if context is not None:
+        context["user"] = user
+
+def set_outcome(outcome: str):
+    """Name how the current request ended, e.g. "invalid_credentials"."""
+    context = _request.get()
+    if context is not None:
+        context["outcome"] = outcome
+
+def _sampled(level: int) -> bool:
+    rate = LOG_SAMPLE_RATES.get(level)
+    return rate is None or random.random() < rate
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the current request's fields."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request.get()
+        if context is not None and context["route"] is None:
+            # The router sets the matched route on the scope once it is known
+            context["route"] = getattr(context["scope"].get("route"), "path", None)
+        for field in _CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field) if context is not None else None)
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments, which may change once this returns; the
+        # listener formats the rest, including any traceback
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the message, request fields and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = {
+            key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and key not in _CONTEXT_FIELDS and value is not None
+        }
+        return f"{line} {extras}" if extras else line
+
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure():
+    """Route the root logger through the queue and start the writer thread."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler()
+    output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    # The access log already covers requests; httpx would add a line per database call
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+    _listener = logging.handlers.QueueListener(_handler.queue, output)
+    _listener.start()
+
+def shutdown():
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _listener = None
+
+class RequestLogMiddleware:
+    """ASGI middleware assigning request ids and logging one record per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not _VALID_REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        context = {"request_id": request_id, "route": None, "user": None, "outcome": None, "scope": scope}
+        token = _request.set(context)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode())
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        exc_info = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            exc_info = sys.exc_info()
+            raise
+        finally:
+            latency_ms = round((time.perf_counter() - start) * 1000, 2)
+            context["route"] = getattr(scope.get("route"), "path", None) or "unmatched"
+            if status_code < 400:
+                level, outcome = logging.INFO, "success"
+            elif status_code < 500:
+                level, outcome = logging.WARNING, "client_error"
+            else:
+                level, outcome = logging.ERROR, "server_error"
+            if exc_info is not None or _sampled(level):
+                access_logger.log(level, "%s %s %s", scope["method"], context["route"], status_code, extra={
+                    "method": scope["method"],
+                    "status": status_code,
+                    "outcome": context["outcome"] or outcome,
+                    "latency_ms": latency_ms,
+                }, exc_info=exc_info)
+            _request.reset(token)
+
+metrics.CallbackMetric(
+    "log_records_dropped_total", "Log records dropped because the log queue was full", "counter", (),
+    lambda: [((), _handler.dropped if _handler is not None else 0)],
+)
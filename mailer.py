@@ -0,0 +1,265 @@
+"""
+Background email outbox.
+
+Requests enqueue messages and return immediately. A single worker task drains
+the queue in batches over one authenticated SMTP connection, which is kept
+open between batches and closed after SMTP_IDLE_TIMEOUT seconds of quiet.
+smtplib is blocking, so every SMTP exchange runs in a worker thread. Failed
+sends are retried with exponential backoff.
+"""
+import asyncio
+import logging
+import os
+import smtplib
+from dataclasses import dataclass
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM") or SMTP_USER
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "30"))
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "5"))
+SMTP_RETRY_BASE_DELAY = float(os.getenv("SMTP_RETRY_BASE_DELAY", "2"))
+OUTBOX_MAX_SIZE = int(os.getenv("OUTBOX_MAX_SIZE", "1000"))
+
+def smtp_configured() -> bool:
+    """Whether enough SMTP settings are present to send mail."""
+    return bool(SMTP_HOST and SMTP_FROM)
+
+@dataclass
+class OutgoingEmail:
+    to: str
+    subject: str
+    body: str
+    attempts: int = 0
+
+class SMTPConnection:
+    """A reusable SMTP session. Only ever used from one thread at a time."""
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self.connects = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
+            if SMTP_STARTTLS:
+                server.starttls()
+            if SMTP_USER and SMTP_PASSWORD:
+                server.login(SMTP_USER, SMTP_PASSWORD)
+        except BaseException:
+            server.close()
+            raise
+        self._server = server
+        self.connects += 1
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def send(self, message: OutgoingEmail):
+        """Send one message, reconnecting once if the session went away."""
+        msg = MIMEMultipart()
+        msg['From'] = SMTP_FROM
+        msg['To'] = message.to
+        msg['Subject'] = message.subject
+        msg.attach(MIMEText(message.body, 'plain'))
+        text = msg.as_string()
+
+        for attempt in range(2):
+            if self._server is None:
+                self._connect()
+            try:
+                with metrics.smtp_send_duration.time():
+                    self._server.sendmail(SMTP_FROM, message.to, text)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if attempt:
+                    raise
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies will not succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+class EmailOutbox:
+    """Bounded queue of outgoing mail drained by a background worker."""
+
+    def __init__(self, max_size: int = OUTBOX_MAX_SIZE):
+        self.max_size = max_size
+        self.connection = SMTPConnection()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._retries = set()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Start the worker on the running event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        """Give queued mail a chance to go out, then stop the worker."""
+        if self._worker is None:
+            return
+        for retry in self._retries:
+            retry.cancel()
+        self._retries.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Email outbox stopped with %d messages unsent", self.depth)
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await asyncio.to_thread(self.connection.close)
+
+    def enqueue(self, to: str, subject: str, body: str) -> bool:
+        """Queue a message for delivery. Returns False if it cannot be accepted."""
+        if not smtp_configured():
+            logger.error("SMTP configuration not complete")
+            return False
+        if self._queue is None:
+            logger.error("Email outbox is not running")
+            return False
+        try:
+            self._queue.put_nowait(OutgoingEmail(to, subject, body))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Email outbox is full")
+            return False
+
+    async def _next_batch(self) -> List[OutgoingEmail]:
+        try:
+            first = await asyncio.wait_for(self._queue.get(), SMTP_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(self.connection.close)
+            first = await self._queue.get()
+        batch = [first]
+        while len(batch) < SMTP_BATCH_SIZE and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def _send_batch(self, batch: List[OutgoingEmail]) -> List[tuple]:
+        """
+        Send a batch on the shared connection; returns (message, error) failures.
+
+        If no session can be established, the rest of the batch fails with the
+        same error instead of every message waiting out SMTP_TIMEOUT again.
+        """
+        failures = []
+        for index, message in enumerate(batch):
+            try:
+                self.connection.send(message)
+            except (smtplib.SMTPException, OSError) as e:
+                if not self.connection.connected:
+                    # Retryable even when the server answered 5xx, e.g. to the login
+                    error = ConnectionError(f"Cannot connect to SMTP server: {e}")
+                    failures.extend((unsent, error) for unsent in batch[index:])
+                    break
+                failures.append((message, e))
+                if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    # The session is unusable; reconnect for the next message.
+                    self.connection.close()
+        return failures
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                failures = await asyncio.to_thread(self._send_batch, batch)
+            except Exception as e:
+                failures = [(message, e) for message in batch]
+            self.batches += 1
+            self.sent += len(batch) - len(failures)
+            for message, error in failures:
+                self._retry_later(message, error)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _retry_later(self, message: OutgoingEmail, error: Exception):
+        message.attempts += 1
+        if _is_permanent(error) or message.attempts > SMTP_MAX_RETRIES:
+            self.failed += 1
+            logger.error("Error sending email to %s: %s", message.to, error)
+            return
+        self.retried += 1
+        delay = SMTP_RETRY_BASE_DELAY * 2 ** (message.attempts - 1)
+        retry = asyncio.create_task(self._requeue(message, delay))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, message: OutgoingEmail, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Email outbox full; dropping retry for %s", message.to)
+
+    def stats(self) -> dict:
+        """Return queue depth and delivery counters."""
+        return {
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "connections": self.connection.connects,
+            "pending_retries": len(self._retries),
+        }
+
+outbox = EmailOutbox()
+
+metrics.CallbackMetric(
+    "email_outbox_depth", "Emails waiting to be sent", "gauge", (), lambda: [((), outbox.depth)]
+)
+metrics.CallbackMetric(
+    "email_outbox_messages_total", "Email delivery outcomes", "counter", ("outcome",),
+    lambda: [
+        (("sent",), outbox.sent), (("failed",), outbox.failed),
+        (("retried",), outbox.retried), (("dropped",), outbox.dropped),
+    ],
+)
@@ -1,14 +1,34 @@
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
+import math
 import os
 
-from routes import auth
+import auth_utils
+import database
+import hashing
+import jwt_keys
+import logs
+import mailer
+import metrics
+import profiling
+import readiness
+import repository
+import revocation
+import shared_state
+from routes import admin, auth
 
 # Load environment variables
 load_dotenv()
 
+logs.configure()
+readiness.timings["import"] = time.perf_counter() - _import_started
+
 app = FastAPI(
     title="Authentication Backend",
     description="Backend API for user authentication with Supabase",
@@ -24,25 +44,85 @@ origins = [
     # Add your production frontend domain here
 ]
 
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Request-ID"],
 )
 
+# Outermost, so request ids and latency cover every other middleware
+app.add_middleware(logs.RequestLogMiddleware)
+
 # Include authentication routes
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+
+@app.exception_handler(repository.DatabaseUnavailableError)
+async def database_unavailable(request, exc: repository.DatabaseUnavailableError):
+    """Answer with 503 when the database is down or the circuit breaker is open."""
+    logs.set_outcome("database_unavailable")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable, please try again"},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+@app.on_event("startup")
+async def startup():
+    # Fail fast on a missing signing key instead of issuing unverifiable tokens
+    jwt_keys.get_key_ring()
+    auth_utils.check_reset_token_secret()
+    await shared_state.client.start()
+    metrics.publisher.start()
+    mailer.outbox.start()
+    revocation.denylist.start()
+    # Uvicorn only starts accepting connections once this returns
+    await readiness.warm_up()
+    readiness.monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await readiness.monitor.stop()
+    await revocation.denylist.stop()
+    await metrics.publisher.stop()
+    await shared_state.client.stop()
+    await mailer.outbox.stop()
+    await database.close_client()
+    hashing.shutdown_executor()
+    logs.shutdown()
 
 @app.get("/")
 async def root():
     return {"message": "Authentication Backend API", "status": "running"}
 
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    return JSONResponse(
+        content=jwt_keys.get_key_ring().jwks,
+        headers={"Cache-Control": f"public, max-age={jwt_keys.JWKS_MAX_AGE}"},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(await metrics.render_all(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving."""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: warmed up and dependencies reachable, from cached checks."""
+    report = readiness.monitor.report()
+    return JSONResponse(content=report, status_code=200 if report["status"] == "ready" else 503)
+
 if __name__ == "__main__":
     import uvicorn
     # Production configuration
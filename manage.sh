@@ -17,6 +17,11 @@ case "$1" in
         systemctl restart backendauth
         systemctl status backendauth
         ;;
+    reload)
+        echo "♻️ Reloading Backend Authentication API without downtime..."
+        systemctl reload backendauth
+        systemctl status backendauth
+        ;;
     status)
         echo "📊 Backend Authentication API Status:"
         systemctl status backendauth
@@ -31,11 +36,11 @@ case "$1" in
         ;;
     update)
         echo "🔄 Updating application..."
-        systemctl stop backendauth
         # Files should be uploaded via SCP before running this
         source venv/bin/activate
         pip install -r requirements.txt
-        systemctl start backendauth
+        # A restart, not a reload: the master process only reads .env and its own modules at start
+        systemctl restart backendauth
         systemctl status backendauth
         ;;
     setup-db)
@@ -46,12 +51,13 @@ case "$1" in
     *)
         echo "Backend Authentication API Management Script"
         echo ""
-        echo "Usage: $0 {start|stop|restart|status|logs|test|update|setup-db}"
+        echo "Usage: $0 {start|stop|restart|reload|status|logs|test|update|setup-db}"
         echo ""
         echo "Commands:"
         echo "  start     - Start the API service"
         echo "  stop      - Stop the API service"
         echo "  restart   - Restart the API service"
+        echo "  reload    - Gracefully reload application code (not .env; use restart)"
         echo "  status    - Show service status"
         echo "  logs      - Show live logs"
         echo "  test      - Test API endpoints"
@@ -0,0 +1,125 @@
+"""
+Bulk user management CLI.
+
+Import users from NDJSON or CSV:
+
+    python manage_users.py import users.ndjson
+    python manage_users.py import users.csv --batch-size 1000
+
+Progress is checkpointed to <file>.checkpoint after every batch, so rerunning
+the same command after an interruption resumes where it stopped.
+
+Export every user (without password hashes) as NDJSON:
+
+    python manage_users.py export > users.ndjson
+    python manage_users.py export --output users.ndjson
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database
+import hashing
+from user_transfer import EXPORT_PAGE_SIZE, IMPORT_BATCH_SIZE, export_users, import_users, parse_records
+
+async def _file_lines(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+def _read_checkpoint(path: str, source: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != source:
+        print(f"❌ Checkpoint {path} belongs to {checkpoint.get('source')}, not {source}")
+        sys.exit(1)
+    return checkpoint["last_line"]
+
+def _write_checkpoint(path: str, source: str, last_line: int):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"source": source, "last_line": last_line}, f)
+    os.replace(tmp_path, path)
+
+async def run_import(args) -> bool:
+    source = os.path.abspath(args.file)
+    fmt = args.format or ("csv" if source.lower().endswith(".csv") else "ndjson")
+    checkpoint_path = args.checkpoint or f"{source}.checkpoint"
+    start_line = _read_checkpoint(checkpoint_path, source)
+    if start_line:
+        print(f"↩️  Resuming after line {start_line}")
+
+    def on_batch(progress):
+        _write_checkpoint(checkpoint_path, source, progress.last_line)
+        print(
+            f"📥 {progress.imported} imported, {progress.skipped} already present, "
+            f"{progress.failed} failed (line {progress.last_line}, {progress.rate:.0f} records/s)"
+        )
+
+    try:
+        progress = await import_users(
+            parse_records(_file_lines(source), fmt),
+            batch_size=args.batch_size,
+            skip_until_line=start_line,
+            on_batch=on_batch,
+        )
+    finally:
+        await database.close_client()
+        hashing.shutdown_executor()
+
+    for error in progress.errors:
+        print(f"⚠️  Line {error['line']}: {error['error']}")
+    if progress.aborted:
+        print(f"❌ Import stopped: {progress.aborted}. Rerun the same command to resume.")
+        return False
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"🎉 Import complete: {progress.imported} imported, {progress.skipped} already present, "
+          f"{progress.failed} failed")
+    return True
+
+async def run_export(args) -> bool:
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    exported = 0
+    try:
+        async for line in export_users(args.page_size):
+            output.write(line)
+            exported += 1
+    finally:
+        await database.close_client()
+        if args.output:
+            output.close()
+    print(f"📤 Exported {exported} users", file=sys.stderr)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk user management")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Import users from NDJSON or CSV")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"])
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--checkpoint", help="Checkpoint file (default: <file>.checkpoint)")
+
+    export_parser = commands.add_parser("export", help="Export users as NDJSON")
+    export_parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    export_parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+
+    args = parser.parse_args()
+    if args.command == "import":
+        success = asyncio.run(run_import(args))
+    else:
+        success = asyncio.run(run_export(args))
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
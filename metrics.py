@@ -0,0 +1,339 @@
+"""
+Lightweight Prometheus metrics.
+
+Counters and histograms are plain dicts keyed by label values, so recording
+a sample is a dict lookup and a few additions. Values owned by other modules
+(cache counters, queue depths) are read through callbacks at scrape time
+instead of being copied on every change. render() produces the Prometheus
+text exposition format served at /metrics.
+
+Under serve.py every worker has its own metrics, and a scrape reaches only
+one of them. Each worker therefore pushes a snapshot to the shared state
+broker every METRICS_PUSH_SECONDS, and render_all() answers a scrape with
+the series of every worker, told apart by a `worker` label holding its pid.
+"""
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import shared_state
+
+load_dotenv()
+
+METRICS_PUSH_SECONDS = float(os.getenv("METRICS_PUSH_SECONDS", "5"))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterable[str]:
+        return ()
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _samples(self):
+        for label_values, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value: float):
+        self._values[label_values] = value
+
+    def _samples(self):
+        for label_values, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, *label_values, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, *label_values) -> "_Timer":
+        """Context manager observing the duration of its block."""
+        return _Timer(self, label_values)
+
+    def _samples(self):
+        for label_values, counts in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            cumulative += counts[len(self.buckets)]
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+            plain = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{plain} {counts[-1]}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram: Histogram, label_values: Tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(*self.label_values, value=time.perf_counter() - self.start)
+
+class CallbackMetric(_Metric):
+    """A metric whose samples are produced by a function at scrape time."""
+
+    def __init__(self, name: str, help: str, type: str, labels: Tuple[str, ...],
+                 callback: Callable[[], Iterable[Tuple[Tuple, float]]]):
+        super().__init__(name, help, labels)
+        self.type = type
+        self.callback = callback
+
+    def _samples(self):
+        for label_values, value in self.callback():
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+def render() -> str:
+    """Render every registered metric in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Aggregation across workers
+
+def snapshot() -> list:
+    """Every registered metric as [name, help, type, sample lines], for the broker."""
+    return [[metric.name, metric.help, metric.type, list(metric._samples())] for metric in _registry]
+
+def _add_label(sample: str, label: str) -> str:
+    name, brace, rest = sample.partition("{")
+    if brace and " " not in name:
+        return f"{name}{{{label},{rest}"
+    name, _, value = sample.partition(" ")
+    return f"{name}{{{label}}} {value}"
+
+def render_snapshots(snapshots: Iterable[Tuple[str, list]]) -> str:
+    """Render (worker, snapshot) pairs, adding a `worker` label to every series."""
+    families: Dict[str, list] = {}
+    for worker, families_of_worker in snapshots:
+        label = f'worker="{_escape(worker)}"'
+        for name, help, type, samples in families_of_worker:
+            family = families.setdefault(name, [help, type, []])
+            family[2].extend(_add_label(sample, label) for sample in samples)
+    lines = []
+    for name, (help, type, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {type}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+async def render_all() -> str:
+    """render(), or under serve.py the metrics of every worker."""
+    if not shared_state.enabled():
+        return render()
+    snapshots = [(str(os.getpid()), snapshot())]
+    try:
+        snapshots.extend(await shared_state.client.request("metrics"))
+    except ConnectionError:
+        # Still label this worker's series, so they match those of full scrapes
+        pass
+    return render_snapshots(snapshots)
+
+class SnapshotPublisher:
+    """Pushes this worker's metrics to the broker every METRICS_PUSH_SECONDS."""
+
+    def __init__(self):
+        self._worker: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        worker = str(os.getpid())
+        while True:
+            shared_state.client.send("metrics_push", worker=worker, families=snapshot())
+            await asyncio.sleep(METRICS_PUSH_SECONDS)
+
+    def start(self):
+        """Start pushing on the running event loop; a no-op without the broker."""
+        if self._worker is None and shared_state.enabled():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop pushing."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+publisher = SnapshotPublisher()
+
+# Request metrics
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served")
+
+# Stage metrics
+
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds", "Password hash/verify time including queueing",
+    ("operation",), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+db_request_duration = Histogram(
+    "db_request_duration_seconds", "Database round trip time", ("table", "operation")
+)
+db_errors = Counter("db_errors_total", "Failed database requests", ("table", "operation"))
+jwt_duration = Histogram(
+    "jwt_duration_seconds", "JWT encode/decode time", ("operation",),
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01),
+)
+smtp_send_duration = Histogram("smtp_send_duration_seconds", "SMTP send time per message")
+
+# Cache and coalescing metrics, read from the objects at scrape time
+
+_caches: Dict[str, object] = {}
+_singleflights: Dict[str, object] = {}
+
+def register_cache(name: str, cache):
+    """Export a TTLCache's size and counters under `cache="<name>"`."""
+    _caches[name] = cache
+
+def register_singleflight(name: str, group):
+    """Export a SingleFlight's counters under `group="<name>"`."""
+    _singleflights[name] = group
+
+def _cache_events():
+    for name, cache in list(_caches.items()):
+        yield (name, "hit"), cache.hits
+        yield (name, "miss"), cache.misses
+        yield (name, "eviction"), cache.evictions
+        yield (name, "expiration"), cache.expirations
+        yield (name, "invalidation"), cache.invalidations
+        yield (name, "stale_hit"), cache.stale_hits
+
+def _cache_hit_ratio():
+    for name, cache in list(_caches.items()):
+        lookups = cache.hits + cache.misses
+        yield (name,), cache.hits / lookups if lookups else 0.0
+
+CallbackMetric(
+    "cache_events_total", "Cache lookups and removals", "counter", ("cache", "event"), _cache_events
+)
+CallbackMetric(
+    "cache_entries", "Live cache entries", "gauge", ("cache",),
+    lambda: [((name,), len(cache)) for name, cache in list(_caches.items())],
+)
+CallbackMetric("cache_hit_ratio", "Cache hit ratio since start", "gauge", ("cache",), _cache_hit_ratio)
+CallbackMetric(
+    "singleflight_calls_total", "Backend calls executed or collapsed into an in-flight call",
+    "counter", ("group", "result"),
+    lambda: [
+        item
+        for name, group in list(_singleflights.items())
+        for item in (((name, "executed"), group.executions), ((name, "collapsed"), group.collapsed))
+    ],
+)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and concurrency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route_path, status_code)
+            http_request_duration.observe(method, route_path, value=elapsed)
@@ -0,0 +1,193 @@
+"""
+Per-request sampling profiler.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked by PROFILE_SAMPLE_RATE. A background thread samples the request's
+stack every PROFILE_INTERVAL_MS: the event loop thread's frames while the
+request is running, and its coroutine await chain while it is suspended, so
+time spent waiting on the database or the hashing pool shows up too.
+
+Each profile is written to PROFILE_DIR in folded-stack format, one
+`frame;frame;frame count` line per distinct stack, which flamegraph.pl,
+speedscope and inferno read directly. At most one request is profiled at a
+time, at most PROFILE_MAX_PER_MINUTE profiles are taken, sampling stops after
+PROFILE_MAX_SECONDS and the oldest files are removed beyond PROFILE_MAX_FILES.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+PROFILE_MAX_PER_MINUTE = int(os.getenv("PROFILE_MAX_PER_MINUTE", "6"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILE_HEADER = b"x-profile"
+
+_lock = threading.Lock()
+_active = False
+_recent = deque()
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _try_start() -> bool:
+    """Claim the single profiling slot if the per-minute budget allows it."""
+    global _active
+    now = time.monotonic()
+    with _lock:
+        while _recent and now - _recent[0] > 60:
+            _recent.popleft()
+        if _active or len(_recent) >= PROFILE_MAX_PER_MINUTE:
+            return False
+        _active = True
+        _recent.append(now)
+        return True
+
+def _release():
+    global _active
+    with _lock:
+        _active = False
+
+class RequestProfiler(threading.Thread):
+    """Samples one asyncio task until stopped, then writes its folded stacks."""
+
+    def __init__(self, filename: str, root_code):
+        super().__init__(name="request-profiler", daemon=True)
+        self.filename = filename
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.root_code = root_code
+        self.samples = Counter()
+        self.label = ""
+        self._stop_event = threading.Event()
+
+    def _running_stack(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            if frame.f_code is self.root_code:
+                stack.reverse()
+                return stack
+            frame = frame.f_back
+        # Caught between task steps, outside the request's frames
+        return []
+
+    def _suspended_stack(self):
+        stack = []
+        recording = False
+        awaitable = self.task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                if recording:
+                    stack.append(f"[await {type(awaitable).__name__}]")
+                break
+            recording = recording or frame.f_code is self.root_code
+            if recording:
+                stack.append(_frame_name(frame.f_code))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+        return stack
+
+    def run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        try:
+            while not self._stop_event.wait(interval) and time.monotonic() < deadline:
+                if asyncio.current_task(self.loop) is self.task:
+                    stack = self._running_stack()
+                else:
+                    stack = self._suspended_stack()
+                if stack:
+                    self.samples[";".join(stack)] += 1
+            self._stop_event.wait()
+            self._write()
+        except Exception:
+            logger.exception("Error writing request profile")
+        finally:
+            _release()
+
+    def stop(self, label: str):
+        """Stop sampling; the profile is written with `label` as its root frame."""
+        self.label = label
+        self._stop_event.set()
+
+    def _write(self):
+        if not self.samples:
+            return
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        root = self.label.replace(";", ":")
+        with open(os.path.join(PROFILE_DIR, self.filename), "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{root};{stack} {count}\n")
+        _prune()
+
+def _prune():
+    """Remove the oldest profiles beyond PROFILE_MAX_FILES."""
+    files = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".folded")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        os.remove(entry.path)
+
+def enabled() -> bool:
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it or are sampled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _requested(self, scope) -> bool:
+        if PROFILE_TOKEN:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled() or not self._requested(scope) or not _try_start():
+            await self.app(scope, receive, send)
+            return
+
+        path = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{path}-{uuid.uuid4().hex[:8]}.folded"
+        profiler = RequestProfiler(filename, ProfilingMiddleware.__call__.__code__)
+        profiler.start()
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", filename.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", scope["path"])
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            profiler.stop(f"{scope['method']} {route} {status_code} {elapsed_ms:.0f}ms")
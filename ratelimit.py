@@ -0,0 +1,155 @@
+"""
+Login throttling.
+
+Signin and forgot-password are limited per client IP and per email with the
+sliding window counters in sliding_window.py, holding at most
+RATE_LIMIT_MAX_KEYS keys.
+
+With several workers started by serve.py the counters live in the shared
+state broker, so every worker sees the same counts; RATE_LIMIT_BACKEND=redis
+(requires the `redis` package) shares them across hosts instead.
+The check runs as a route dependency, before admission control, the database
+lookup and bcrypt.
+"""
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from dotenv import load_dotenv
+
+import logs
+import metrics
+import shared_state
+from sliding_window import MemoryBackend, estimate, retry_after
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+def parse_limit(value: str) -> Optional[Tuple[int, int]]:
+    """Parse "<requests>/<seconds>"; an empty value disables the limit."""
+    if not value:
+        return None
+    requests, seconds = value.split("/")
+    return int(requests), int(seconds)
+
+# endpoint -> key kind -> (requests, window seconds)
+LIMITS: Dict[str, Dict[str, Optional[Tuple[int, int]]]] = {
+    "signin": {
+        "ip": parse_limit(os.getenv("RATE_LIMIT_SIGNIN_IP", "30/60")),
+        "email": parse_limit(os.getenv("RATE_LIMIT_SIGNIN_EMAIL", "10/300")),
+    },
+    "forgot-password": {
+        "ip": parse_limit(os.getenv("RATE_LIMIT_FORGOT_IP", "10/3600")),
+        "email": parse_limit(os.getenv("RATE_LIMIT_FORGOT_EMAIL", "3/3600")),
+    },
+}
+
+rate_limited = metrics.Counter(
+    "rate_limited_total", "Requests rejected by login throttling", ("endpoint", "key")
+)
+
+class RedisBackend:
+    """Sliding window counters shared by every worker through Redis."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ValueError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        self._redis = redis.from_url(url)
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        now = time.time()
+        window_index = int(now // window)
+        elapsed = now - window_index * window
+        current_key = f"ratelimit:{key}:{window_index}"
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.get(f"ratelimit:{key}:{window_index - 1}")
+            pipe.get(current_key)
+            previous, current = await pipe.execute()
+        previous, current = int(previous or 0), int(current or 0)
+        if estimate(previous, current, elapsed, window) + 1 > limit:
+            return max(retry_after(previous, current, elapsed, limit, window), 1)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, 2 * window)
+            await pipe.execute()
+        return 0
+
+    def __len__(self) -> int:
+        return 0
+
+class BrokerBackend:
+    """Counters held by the shared state broker, falling back to local ones while it is down."""
+
+    def __init__(self, max_keys: int):
+        self.local = MemoryBackend(max_keys)
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        try:
+            return await shared_state.client.request("hit", key=key, limit=limit, window=window)
+        except ConnectionError:
+            return await self.local.hit(key, limit, window)
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+_backend = None
+
+def get_backend():
+    """Return the configured counter backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        if RATE_LIMIT_BACKEND == "redis":
+            _backend = RedisBackend(RATE_LIMIT_REDIS_URL)
+        elif shared_state.enabled():
+            _backend = BrokerBackend(RATE_LIMIT_MAX_KEYS)
+        else:
+            _backend = MemoryBackend(RATE_LIMIT_MAX_KEYS)
+    return _backend
+
+async def _email_from_body(request: Request) -> Optional[str]:
+    # FastAPI has already parsed the body for the endpoint, so this is cached
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) else None
+
+async def check(endpoint: str, ip: Optional[str], email: Optional[str]):
+    """Count one attempt against every limit of an endpoint, or raise 429."""
+    backend = get_backend()
+    for kind, value in (("ip", ip), ("email", email)):
+        limit = LIMITS[endpoint][kind]
+        if limit is None or not value:
+            continue
+        wait = await backend.hit(f"{endpoint}:{kind}:{value}", *limit)
+        if wait:
+            rate_limited.inc(endpoint, kind)
+            logs.set_outcome("rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+def rate_limit(endpoint: str):
+    """Route dependency throttling `endpoint` per client IP and per email."""
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        ip = request.client.host if request.client else None
+        await check(endpoint, ip, await _email_from_body(request))
+    return dependency
+
+metrics.CallbackMetric(
+    "rate_limit_keys", "Keys tracked by the in-memory rate limiter", "gauge", (),
+    lambda: [((), len(_backend) if _backend is not None else 0)],
+)
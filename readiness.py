@@ -0,0 +1,154 @@
+"""
+Startup warm-up and readiness checks.
+
+warm_up() runs during application startup, before the server accepts
+connections. It opens pooled database connections, starts the hashing
+workers and loads the JWT key ring, then logs how long importing and
+warming took.
+
+ReadinessMonitor re-checks the dependencies every READY_CHECK_INTERVAL
+seconds in the background, and /ready answers from the last results. The
+instance is ready once warm-up has finished and every required check passed
+recently. SMTP is only checked with READY_REQUIRE_SMTP=true: an SMTP outage
+affects password reset mail but not sign-in, and otherwise every worker would
+open a connection to the mail server each interval for nothing.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+import circuit
+import database
+import hashing
+import jwt_keys
+import mailer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+READY_CHECK_INTERVAL = float(os.getenv("READY_CHECK_INTERVAL", "5"))
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "2"))
+READY_REQUIRE_SMTP = os.getenv("READY_REQUIRE_SMTP", "false").lower() == "true"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
+
+# Startup phase -> seconds
+timings: Dict[str, float] = {}
+
+async def _warm_jwt():
+    # Only the key ring: a trial token would leave an entry in the token cache
+    jwt_keys.get_key_ring()
+
+async def _timed(name: str, step: Awaitable):
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(step, WARMUP_TIMEOUT)
+    except Exception as e:
+        logger.error("Warm-up of %s failed: %r", name, e)
+    finally:
+        timings[name] = time.perf_counter() - start
+
+async def warm_up():
+    """Warm the connection pool, hashing workers and JWT keys concurrently."""
+    start = time.perf_counter()
+    await asyncio.gather(
+        _timed("database", database.warm_up()),
+        _timed("hashing", hashing.warm_up()),
+        _timed("jwt_keys", _warm_jwt()),
+    )
+    timings["warm_up"] = time.perf_counter() - start
+    monitor.warmed = True
+    await monitor.run_checks()
+    steps = ", ".join(
+        f"{name} {timings[name] * 1000:.0f} ms" for name in ("database", "hashing", "jwt_keys")
+    )
+    logger.info(
+        "Startup: import %.0f ms, warm-up %.0f ms (%s)",
+        timings.get("import", 0) * 1000, timings["warm_up"] * 1000, steps,
+        extra={"startup_ms": {name: round(seconds * 1000, 1) for name, seconds in timings.items()}},
+    )
+
+async def _check_smtp():
+    if not mailer.smtp_configured():
+        raise RuntimeError("SMTP is not configured")
+    _, writer = await asyncio.open_connection(mailer.SMTP_HOST, mailer.SMTP_PORT)
+    writer.close()
+    await writer.wait_closed()
+
+class ReadinessMonitor:
+    """Periodically checked dependency status with cached results."""
+
+    def __init__(self):
+        # name -> (check, required for readiness)
+        self.checks: Dict[str, tuple] = {"database": (database.ping, True)}
+        if READY_REQUIRE_SMTP:
+            self.checks["smtp"] = (_check_smtp, True)
+        self.results: Dict[str, dict] = {}
+        self.warmed = False
+        self._worker: Optional[asyncio.Task] = None
+
+    async def _run_check(self, name: str, check: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(check(), READY_CHECK_TIMEOUT)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        self.results[name] = {
+            "ok": error is None,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "checked_at": time.time(),
+        }
+
+    async def run_checks(self):
+        """Run every check concurrently and store the results."""
+        await asyncio.gather(*(self._run_check(name, check) for name, (check, _) in self.checks.items()))
+
+    def ready(self) -> bool:
+        """Warmed up, and every required check passed within the last few intervals."""
+        if not self.warmed:
+            return False
+        stale_before = time.time() - 3 * READY_CHECK_INTERVAL
+        for name, (_, required) in self.checks.items():
+            result = self.results.get(name)
+            if required and (result is None or not result["ok"] or result["checked_at"] < stale_before):
+                return False
+        return True
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready() else "not ready",
+            "checks": {
+                name: {**self.results.get(name, {"ok": False, "error": "not checked yet"}), "required": required}
+                for name, (_, required) in self.checks.items()
+            },
+            "startup_ms": {name: round(seconds * 1000, 1) for name, seconds in timings.items()},
+            "database_circuit": circuit.database_breaker.state,
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(READY_CHECK_INTERVAL)
+            await self.run_checks()
+
+    def start(self):
+        """Start refreshing the checks on the running event loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+monitor = ReadinessMonitor()
@@ -0,0 +1,242 @@
+"""
+Async data access for the users, password_resets, refresh_tokens and
+token_revocations tables.
+
+Every operation goes through the pooled PostgREST client in database.py, so
+concurrent requests overlap their round trips instead of blocking the loop.
+Each request has a deadline for its kind of operation and passes through the
+database circuit breaker. Timeouts, connection errors, 5xx responses and an
+open circuit all raise DatabaseUnavailableError, which the app answers with
+503.
+"""
+import asyncio
+from typing import List, Optional
+
+import httpx
+
+import metrics
+from circuit import CircuitOpenError, database_breaker
+from database import DB_BULK_TIMEOUT, DB_READ_TIMEOUT, DB_WRITE_TIMEOUT, get_client
+
+USERS_TABLE = "users"
+PASSWORD_RESETS_TABLE = "password_resets"
+REFRESH_TOKENS_TABLE = "refresh_tokens"
+TOKEN_REVOCATIONS_TABLE = "token_revocations"
+
+REVOCATION_PAGE_SIZE = 1000
+
+UNIQUE_VIOLATION = "23505"
+
+_OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+class DuplicateRecordError(Exception):
+    """An insert violated a unique constraint."""
+
+class DatabaseUnavailableError(Exception):
+    """The database failed, timed out or is being skipped by the circuit breaker."""
+
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+async def _send(method: str, table: str, operation: str, timeout: Optional[float], **kwargs):
+    if timeout is None:
+        timeout = DB_READ_TIMEOUT if operation == "select" else DB_WRITE_TIMEOUT
+    try:
+        with metrics.db_request_duration.time(table, operation):
+            response = await asyncio.wait_for(
+                get_client().request(method, f"/{table}", **kwargs), timeout
+            )
+    except asyncio.TimeoutError:
+        metrics.db_errors.inc(table, operation)
+        raise DatabaseUnavailableError(f"{operation} on {table} timed out after {timeout:g}s")
+    except httpx.TransportError as e:
+        metrics.db_errors.inc(table, operation)
+        raise DatabaseUnavailableError(f"{operation} on {table} failed: {e!r}")
+    if response.is_error:
+        metrics.db_errors.inc(table, operation)
+    if response.status_code >= 500:
+        raise DatabaseUnavailableError(
+            f"{operation} on {table} failed with HTTP {response.status_code}"
+        )
+    return response
+
+async def _request(method: str, table: str, params: Optional[dict] = None,
+                   json=None, prefer: Optional[str] = None, timeout: Optional[float] = None) -> list:
+    """Send a request to PostgREST and return the decoded rows."""
+    headers = {"Prefer": prefer} if prefer else None
+    operation = _OPERATIONS.get(method, method)
+    kwargs = {"params": params, "json": json, "headers": headers}
+    try:
+        probe = database_breaker.attempt()
+    except CircuitOpenError as e:
+        raise DatabaseUnavailableError(str(e), e.retry_after)
+    ok = None
+    try:
+        response = await _send(method, table, operation, timeout, **kwargs)
+        ok = True
+    except DatabaseUnavailableError:
+        ok = False
+        raise
+    finally:
+        database_breaker.record(ok, probe)
+    if response.status_code == 409 and response.json().get("code") == UNIQUE_VIOLATION:
+        raise DuplicateRecordError(response.json().get("message"))
+    response.raise_for_status()
+    if not response.content:
+        return []
+    return response.json()
+
+def _first(rows: list) -> Optional[dict]:
+    return rows[0] if rows else None
+
+# Users
+
+async def fetch_user_by_email(email: str) -> Optional[dict]:
+    """Fetch a single user row by email."""
+    rows = await _request(
+        "GET", USERS_TABLE, params={"select": "*", "email": f"eq.{email}", "limit": "1"}
+    )
+    return _first(rows)
+
+async def insert_user(user_data: dict) -> Optional[dict]:
+    """Insert a user row and return it; raises DuplicateRecordError if the email is taken."""
+    rows = await _request("POST", USERS_TABLE, json=user_data, prefer="return=representation")
+    return _first(rows)
+
+async def insert_users(rows: List[dict]) -> int:
+    """Insert many user rows in one request, skipping emails that already exist."""
+    inserted = await _request(
+        "POST", USERS_TABLE, params={"on_conflict": "email", "select": "email"}, json=rows,
+        prefer="return=representation,resolution=ignore-duplicates", timeout=DB_BULK_TIMEOUT,
+    )
+    return len(inserted)
+
+USER_EXPORT_COLUMNS = "id,email,first_name,last_name,is_verified,created_at,updated_at"
+
+async def fetch_users_page(limit: int, after: Optional[tuple] = None) -> List[dict]:
+    """
+    Fetch users ordered by (created_at, id), starting after a keyset cursor.
+
+    `after` is the (created_at, id) of the last row already seen. Seeking
+    on the index instead of using OFFSET keeps every page equally cheap.
+    Password hashes are never selected.
+    """
+    params = {"select": USER_EXPORT_COLUMNS, "order": "created_at.asc,id.asc", "limit": str(limit)}
+    if after is not None:
+        created_at, user_id = after
+        params["or"] = (
+            f'(created_at.gt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.gt.{user_id}))'
+        )
+    return await _request("GET", USERS_TABLE, params=params, timeout=DB_BULK_TIMEOUT)
+
+async def update_user(email: str, values: dict, match: Optional[dict] = None) -> Optional[dict]:
+    """
+    Update the user with the given email and return the updated row.
+
+    `match` adds equality conditions the row must still satisfy, turning the
+    update into a compare-and-set; no row is returned if they do not hold.
+    """
+    params = {"email": f"eq.{email}"}
+    for column, value in (match or {}).items():
+        params[column] = f"eq.{value}"
+    rows = await _request(
+        "PATCH", USERS_TABLE, params=params, json=values, prefer="return=representation",
+    )
+    return _first(rows)
+
+# Password reset tokens
+
+async def delete_reset_tokens(email: str):
+    """Delete every reset token issued for an email."""
+    await _request("DELETE", PASSWORD_RESETS_TABLE, params={"email": f"eq.{email}"})
+
+async def insert_reset_token(reset_data: dict) -> Optional[dict]:
+    """Insert a reset token row and return it."""
+    rows = await _request(
+        "POST", PASSWORD_RESETS_TABLE, json=reset_data, prefer="return=representation"
+    )
+    return _first(rows)
+
+async def fetch_unused_reset_token(token: str) -> Optional[dict]:
+    """Fetch an unused reset token row."""
+    rows = await _request(
+        "GET", PASSWORD_RESETS_TABLE,
+        params={"select": "*", "token": f"eq.{token}", "used": "eq.false", "limit": "1"},
+    )
+    return _first(rows)
+
+async def mark_reset_token_used(token: str):
+    """Flag a reset token as used."""
+    await _request(
+        "PATCH", PASSWORD_RESETS_TABLE, params={"token": f"eq.{token}"}, json={"used": True}
+    )
+
+# Refresh tokens
+
+async def insert_refresh_token(token_data: dict) -> Optional[dict]:
+    """Insert a refresh token row and return it."""
+    rows = await _request(
+        "POST", REFRESH_TOKENS_TABLE, json=token_data, prefer="return=representation"
+    )
+    return _first(rows)
+
+async def claim_refresh_token(token_hash: str) -> Optional[dict]:
+    """
+    Atomically mark a live refresh token as used and return it.
+
+    Returns None when the token is unknown, already used or revoked, so two
+    concurrent rotations of the same token cannot both succeed.
+    """
+    rows = await _request(
+        "PATCH", REFRESH_TOKENS_TABLE,
+        params={"token_hash": f"eq.{token_hash}", "used": "eq.false", "revoked": "eq.false"},
+        json={"used": True}, prefer="return=representation",
+    )
+    return _first(rows)
+
+async def fetch_refresh_token(token_hash: str) -> Optional[dict]:
+    """Fetch a refresh token row by hash regardless of state."""
+    rows = await _request(
+        "GET", REFRESH_TOKENS_TABLE,
+        params={"select": "*", "token_hash": f"eq.{token_hash}", "limit": "1"},
+    )
+    return _first(rows)
+
+async def revoke_refresh_token_family(family_id: str):
+    """Revoke every refresh token descended from the same sign-in."""
+    await _request(
+        "PATCH", REFRESH_TOKENS_TABLE, params={"family_id": f"eq.{family_id}"},
+        json={"revoked": True},
+    )
+
+async def revoke_refresh_tokens_for_email(email: str):
+    """Revoke every refresh token issued to a user."""
+    await _request(
+        "PATCH", REFRESH_TOKENS_TABLE,
+        params={"email": f"eq.{email}", "revoked": "eq.false"}, json={"revoked": True},
+    )
+
+# Access token revocations
+
+async def insert_revocation(revocation: dict):
+    """Insert a token_revocations row."""
+    await _request("POST", TOKEN_REVOCATIONS_TABLE, json=revocation)
+
+async def fetch_revocations(now: str, after_id: int = 0, since: Optional[str] = None) -> List[dict]:
+    """
+    Fetch a page of unexpired revocations ordered by id, after a keyset cursor.
+
+    `since` restricts the page to rows created after that time.
+    """
+    params = {
+        "select": "id,jti,email,revoked_before,expires_at",
+        "expires_at": f"gt.{now}",
+        "id": f"gt.{after_id}",
+        "order": "id.asc",
+        "limit": str(REVOCATION_PAGE_SIZE),
+    }
+    if since is not None:
+        params["created_at"] = f"gt.{since}"
+    return await _request("GET", TOKEN_REVOCATIONS_TABLE, params=params)
@@ -0,0 +1,181 @@
+"""
+Access token revocation.
+
+Access tokens carry a `jti` and a millisecond `iat`. Logging out stores the
+token's jti until the token expires; revoking every session of a user stores
+a watermark, and any token of that user issued at or before it is rejected.
+Both live in the token_revocations table and in an in-process denylist that
+verify_token checks with two dict lookups after the (cached) signature check.
+
+Entries are dropped once the tokens they cover have expired, so the list only
+holds revocations from the last ACCESS_TOKEN_EXPIRE_MINUTES. Revocations are
+broadcast to the other workers through the shared state broker, and a
+background sync every REVOCATION_SYNC_SECONDS picks up anything missed and
+revocations made on other hosts.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+import repository
+import shared_state
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# Rows committed out of id order are caught by re-reading this recent window
+SYNC_OVERLAP_SECONDS = 60
+
+def _timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+class RevocationList:
+    """In-memory denylist of revoked token ids and per-user watermarks."""
+
+    def __init__(self):
+        # jti -> token expiry
+        self._tokens: Dict[str, float] = {}
+        # email -> (tokens issued at or before this are revoked, entry expiry)
+        self._users: Dict[str, Tuple[float, float]] = {}
+        self.rejected = 0
+        self._synced_at: Optional[float] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Whether verified token claims belong to a revoked token."""
+        if self._tokens and payload.get("jti") in self._tokens:
+            self.rejected += 1
+            return True
+        if self._users:
+            entry = self._users.get(payload.get("sub"))
+            if entry is not None and payload.get("iat", 0) <= entry[0]:
+                self.rejected += 1
+                return True
+        return False
+
+    def add_token(self, jti: str, expires_at: float):
+        self._tokens[jti] = expires_at
+
+    def add_user(self, email: str, revoked_before: float, expires_at: float):
+        current = self._users.get(email)
+        if current is None or current[0] < revoked_before:
+            self._users[email] = (revoked_before, expires_at)
+
+    def apply(self, row: dict):
+        """Add a token_revocations row to the denylist."""
+        expires_at = _timestamp(row["expires_at"])
+        if row.get("jti"):
+            self.add_token(row["jti"], expires_at)
+        else:
+            self.add_user(row["email"], _timestamp(row["revoked_before"]), expires_at)
+
+    def prune(self, now: Optional[float] = None):
+        """Drop entries whose tokens have all expired."""
+        now = now or time.time()
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+        self._users = {email: entry for email, entry in self._users.items() if entry[1] > now}
+
+    async def sync(self):
+        """Load revocations written since the last sync, or all live ones the first time."""
+        started = time.time()
+        since = None
+        if self._synced_at is not None:
+            since = _isoformat(self._synced_at - SYNC_OVERLAP_SECONDS)
+        after_id = 0
+        while True:
+            rows = await repository.fetch_revocations(_isoformat(started), after_id, since)
+            for row in rows:
+                self.apply(row)
+            if len(rows) < repository.REVOCATION_PAGE_SIZE:
+                break
+            after_id = rows[-1]["id"]
+        self._synced_at = started
+        self.prune(started)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error("Error syncing token revocations: %s", e)
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+
+    def start(self):
+        """Start the sync loop on the running event loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sync loop."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def __len__(self) -> int:
+        return len(self._tokens) + len(self._users)
+
+    def stats(self) -> dict:
+        return {"tokens": len(self._tokens), "users": len(self._users), "rejected": self.rejected}
+
+denylist = RevocationList()
+
+async def revoke_token(payload: dict) -> bool:
+    """Revoke one access token until it expires."""
+    jti = payload.get("jti")
+    if not jti or "exp" not in payload:
+        return False
+    denylist.add_token(jti, payload["exp"])
+    shared_state.client.publish("revocation", {"jti": jti, "expires_at": payload["exp"]})
+    await repository.insert_revocation({
+        "jti": jti,
+        "email": payload.get("sub"),
+        "expires_at": _isoformat(payload["exp"]),
+    })
+    return True
+
+async def revoke_user(email: str, token_lifetime: timedelta):
+    """Revoke every access token issued to a user so far."""
+    now = time.time()
+    expires_at = now + token_lifetime.total_seconds()
+    denylist.add_user(email, now, expires_at)
+    shared_state.client.publish(
+        "revocation", {"email": email, "revoked_before": now, "expires_at": expires_at}
+    )
+    await repository.insert_revocation({
+        "email": email,
+        "revoked_before": _isoformat(now),
+        "expires_at": _isoformat(expires_at),
+    })
+
+def _on_revocation(event: dict):
+    if event.get("jti"):
+        denylist.add_token(event["jti"], event["expires_at"])
+    else:
+        denylist.add_user(event["email"], event["revoked_before"], event["expires_at"])
+
+shared_state.client.subscribe("revocation", _on_revocation)
+
+metrics.CallbackMetric(
+    "revocation_entries", "Live entries in the access token denylist", "gauge", ("kind",),
+    lambda: [(("token",), len(denylist._tokens)), (("user",), len(denylist._users))],
+)
+metrics.CallbackMetric(
+    "revoked_token_rejections_total", "Requests rejected because their token was revoked",
+    "counter", (), lambda: [((), denylist.rejected)],
+)
@@ -0,0 +1,51 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from schemas import ImportSummary
+from user_transfer import (
+    EXPORT_PAGE_SIZE,
+    IMPORT_BATCH_SIZE,
+    export_users,
+    import_users,
+    iter_lines,
+    parse_records,
+)
+
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+router = APIRouter()
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Allow the request only with the configured admin API key."""
+    if not ADMIN_API_KEY or not x_admin_key or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+
+@router.post("/users/import", response_model=ImportSummary, dependencies=[Depends(require_admin)])
+async def import_users_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+    skip_until_line: int = Query(0, ge=0),
+):
+    """
+    Bulk import users from an NDJSON or CSV request body.
+
+    The body is streamed, so it can be arbitrarily large. To resume an
+    interrupted import, send the same body with `skip_until_line` set to the
+    `last_line` of the previous response.
+    """
+    records = parse_records(iter_lines(request.stream()), format)
+    progress = await import_users(records, batch_size=batch_size, skip_until_line=skip_until_line)
+    return ImportSummary(**progress.summary())
+
+@router.get("/users/export", dependencies=[Depends(require_admin)])
+async def export_users_endpoint(page_size: int = Query(EXPORT_PAGE_SIZE, ge=1, le=10000)):
+    """Stream every user as NDJSON, oldest first. Password hashes are never included."""
+    return StreamingResponse(export_users(page_size), media_type="application/x-ndjson")
@@ -1,39 +1,88 @@
+import hashlib
 from datetime import timedelta
-from fastapi import APIRouter, HTTPException, status, Depends
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
 
-from schemas import UserSignUp, UserSignIn, ForgotPassword, ResetPassword, Token, UserResponse, MessageResponse
+from admission import password_endpoint
+from ratelimit import rate_limit
+from routes.admin import require_admin
+from schemas import (
+    UserSignUp,
+    UserSignIn,
+    ForgotPassword,
+    ResetPassword,
+    Token,
+    RefreshTokenRequest,
+    LogoutRequest,
+    TokenRefreshResponse,
+    UserResponse,
+    MessageResponse,
+    TokenIntrospectionRequest,
+    TokenIntrospection,
+    TokenIntrospectionResponse,
+    user_response,
+)
 from auth_utils import (
     authenticate_user, 
     create_user, 
     get_user_by_email, 
     create_access_token, 
     verify_token,
-    generate_reset_token,
-    store_reset_token,
+    decode_token,
+    decode_tokens,
+    issue_reset_token,
     verify_reset_token,
     mark_reset_token_used,
     update_user_password,
     send_reset_email,
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+    revoke_access_token,
+    revoke_all_sessions,
+    UserAlreadyExistsError,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
 router = APIRouter()
 security = HTTPBearer()
 
-@router.post("/signup", response_model=MessageResponse)
+# Browsers may keep /me but must revalidate it; shared caches must not store it
+USER_CACHE_CONTROL = "private, no-cache"
+
+class ModelResponse(Response):
+    """JSON response written straight from a model by its compiled pydantic-core serializer."""
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.__pydantic_serializer__.to_json(content)
+
+def user_etag(user: dict) -> str:
+    """Strong ETag for a users row; updated_at changes on every write to the row."""
+    version = f"{user['id']}:{user.get('updated_at') or user.get('created_at')}"
+    return '"' + hashlib.sha256(version.encode()).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix is ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+@router.post("/signup", response_model=MessageResponse, dependencies=[Depends(password_endpoint)])
 async def sign_up(user: UserSignUp):
     """Sign up a new user."""
-    # Check if user already exists
-    existing_user = get_user_by_email(user.email)
-    if existing_user:
+    # Create new user; the insert fails if the email is already registered
+    try:
+        new_user = await create_user(user.email, user.password, user.first_name, user.last_name)
+    except UserAlreadyExistsError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
-    # Create new user
-    new_user = create_user(user.email, user.password, user.first_name, user.last_name)
     if not new_user:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -45,10 +94,14 @@ async def sign_up(user: UserSignUp):
         success=True
     )
 
-@router.post("/signin", response_model=Token)
+@router.post(
+    "/signin",
+    response_model=Token,
+    dependencies=[Depends(rate_limit("signin")), Depends(password_endpoint)],
+)
 async def sign_in(user: UserSignIn):
     """Sign in a user."""
-    authenticated_user = authenticate_user(user.email, user.password)
+    authenticated_user = await authenticate_user(user.email, user.password)
     if not authenticated_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,27 +116,43 @@ async def sign_in(user: UserSignIn):
         expires_delta=access_token_expires
     )
     
-    # Prepare user response
-    user_response = UserResponse(
-        id=authenticated_user["id"],
-        email=authenticated_user["email"],
-        first_name=authenticated_user["first_name"],
-        last_name=authenticated_user["last_name"],
-        created_at=authenticated_user["created_at"],
-        is_verified=authenticated_user["is_verified"]
-    )
+    refresh_token = await issue_refresh_token(authenticated_user["email"])
     
-    return Token(
+    return ModelResponse(Token(
         access_token=access_token,
         token_type="bearer",
-        user=user_response
+        user=user_response(authenticated_user),
+        refresh_token=refresh_token
+    ))
+
+@router.post("/refresh", response_model=TokenRefreshResponse)
+async def refresh_access_token(request: RefreshTokenRequest):
+    """Exchange a refresh token for a new access token and refresh token."""
+    rotated = await rotate_refresh_token(request.refresh_token)
+    if not rotated:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    email, refresh_token = rotated
+    access_token = create_access_token(
+        data={"sub": email},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    
+    return TokenRefreshResponse(
+        access_token=access_token,
+        refresh_token=refresh_token,
+        token_type="bearer"
     )
 
-@router.post("/forgot-password", response_model=MessageResponse)
+@router.post("/forgot-password", response_model=MessageResponse, dependencies=[Depends(rate_limit("forgot-password"))])
 async def forgot_password(request: ForgotPassword):
     """Request password reset."""
     # Check if user exists
-    user = get_user_by_email(request.email)
+    user = await get_user_by_email(request.email)
     if not user:
         # Don't reveal whether email exists or not for security
         return MessageResponse(
@@ -92,10 +161,8 @@ async def forgot_password(request: ForgotPassword):
         )
     
     # Generate reset token
-    reset_token = generate_reset_token()
-    
-    # Store reset token
-    if not store_reset_token(request.email, reset_token):
+    reset_token = await issue_reset_token(user)
+    if not reset_token:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to generate reset token"
@@ -113,11 +180,11 @@ async def forgot_password(request: ForgotPassword):
         success=True
     )
 
-@router.post("/reset-password", response_model=MessageResponse)
+@router.post("/reset-password", response_model=MessageResponse, dependencies=[Depends(password_endpoint)])
 async def reset_password(request: ResetPassword):
     """Reset password using token."""
     # Verify reset token
-    email = verify_reset_token(request.token)
+    email = await verify_reset_token(request.token)
     if not email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -125,23 +192,34 @@ async def reset_password(request: ResetPassword):
         )
     
     # Update password
-    if not update_user_password(email, request.new_password):
+    if not await update_user_password(email, request.new_password, reset_token=request.token):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update password"
         )
     
     # Mark token as used
-    mark_reset_token_used(request.token)
+    await mark_reset_token_used(request.token)
+    
+    # Sessions started with the old password must sign in again
+    await revoke_all_sessions(email)
     
     return MessageResponse(
         message="Password updated successfully",
         success=True
     )
 
-@router.get("/me", response_model=UserResponse)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user information."""
+@router.get("/me", response_model=UserResponse, responses={304: {"description": "Not modified"}})
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Get current user information.
+
+    The response carries an ETag; sending it back in If-None-Match returns
+    304 with no body while the user is unchanged.
+    """
     token = credentials.credentials
     email = verify_token(token)
     
@@ -152,21 +230,18 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = get_user_by_email(email)
+    user = await get_user_by_email(email, allow_stale=True)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return UserResponse(
-        id=user["id"],
-        email=user["email"],
-        first_name=user["first_name"],
-        last_name=user["last_name"],
-        created_at=user["created_at"],
-        is_verified=user["is_verified"]
-    )
+    etag = user_etag(user)
+    headers = {"ETag": etag, "Cache-Control": USER_CACHE_CONTROL, "Vary": "Authorization"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return ModelResponse(user_response(user), headers=headers)
 
 @router.post("/verify-token", response_model=MessageResponse)
 async def verify_access_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -185,3 +260,69 @@ async def verify_access_token(credentials: HTTPAuthorizationCredentials = Depend
         message="Token is valid",
         success=True
     )
+
+@router.post("/logout", response_model=MessageResponse)
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+):
+    """Revoke the current access token and, if given, its refresh token."""
+    payload = decode_token(credentials.credentials)
+    # Tokens issued before revocation existed have no jti and cannot be revoked one by one
+    if not payload or not payload.get("sub") or not payload.get("jti"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    if not await revoke_access_token(payload):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to revoke token"
+        )
+    if request and request.refresh_token:
+        await revoke_refresh_token(request.refresh_token, payload["sub"])
+    
+    return MessageResponse(
+        message="Logged out successfully",
+        success=True
+    )
+
+@router.post("/revoke-all", response_model=MessageResponse)
+async def revoke_all(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Sign the current user out of every session, including this one."""
+    email = verify_token(credentials.credentials)
+    if not email:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    if not await revoke_all_sessions(email):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to revoke sessions"
+        )
+    
+    return MessageResponse(
+        message="All sessions have been revoked",
+        success=True
+    )
+
+@router.post("/introspect", response_model=TokenIntrospectionResponse, dependencies=[Depends(require_admin)])
+async def introspect_tokens(request: TokenIntrospectionRequest):
+    """
+    Check a batch of tokens and report validity, subject and expiry for each.
+
+    Requires the admin API key, since it would otherwise let anyone test
+    stolen or guessed tokens and read their claims in bulk.
+    """
+    results = []
+    for payload in decode_tokens(request.tokens):
+        if payload is None or payload.get("sub") is None:
+            results.append(TokenIntrospection(active=False))
+        else:
+            results.append(TokenIntrospection(active=True, sub=payload["sub"], exp=payload.get("exp")))
+    return TokenIntrospectionResponse(results=results)
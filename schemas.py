@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
 from datetime import datetime
 
 class UserSignUp(BaseModel):
@@ -27,10 +27,26 @@ class UserResponse(BaseModel):
     created_at: datetime
     is_verified: bool
 
+def user_response(user: dict) -> UserResponse:
+    """Build the public view of a users row; other columns, such as the password hash, are ignored."""
+    return UserResponse.model_validate(user)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class TokenRefreshResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -38,3 +54,27 @@ class TokenData(BaseModel):
 class MessageResponse(BaseModel):
     message: str
     success: bool
+
+class TokenIntrospectionRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, max_length=500)
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+
+class TokenIntrospectionResponse(BaseModel):
+    results: List[TokenIntrospection]
+
+class ImportRecordError(BaseModel):
+    line: int
+    error: str
+
+class ImportSummary(BaseModel):
+    processed: int
+    imported: int
+    skipped: int
+    failed: int
+    last_line: int
+    aborted: Optional[str] = None
+    errors: List[ImportRecordError]
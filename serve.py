@@ -0,0 +1,102 @@
+"""
+Production launcher.
+
+Runs the app under gunicorn with uvicorn workers, one per CPU core by
+default, plus the shared state broker in the master process:
+
+    python serve.py
+    WEB_WORKERS=8 PORT=8000 python serve.py
+
+`kill -HUP <master pid>` reloads gracefully: new workers import the
+application code afresh, and old ones finish their in-flight requests before
+exiting. The master imports no application modules, only broker.py and
+sliding_window.py, so workers never inherit stale copies. Settings are not
+reloaded: the master read .env into the environment at start, workers
+inherit it, and load_dotenv() does not override it, so changes to .env (and
+to broker.py or sliding_window.py) need a full restart.
+
+The broker lives in the master, so rate-limit counters survive a reload.
+Each worker gets an equal share of the cores for its hashing pool unless
+HASH_WORKERS is set.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "127.0.0.1")  # Nginx proxies to localhost
+PORT = int(os.getenv("PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0")) or os.cpu_count() or 1
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET") or os.path.join(
+    tempfile.gettempdir(), f"auth-backend-{PORT}.sock"
+)
+
+class BrokerThread(threading.Thread):
+    """Runs the shared state broker on its own event loop in the master process."""
+
+    def __init__(self, path: str):
+        super().__init__(name="shared-state-broker", daemon=True)
+        self.path = path
+        self.ready = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        from broker import Broker
+
+        asyncio.set_event_loop(self.loop)
+        self.broker = Broker(self.path, RATE_LIMIT_MAX_KEYS)
+        self.loop.run_until_complete(self.broker.start())
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.broker.stop())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join(timeout=5)
+
+def main():
+    from gunicorn.app.base import BaseApplication
+
+    # Workers read these when they import the app
+    os.environ["SHARED_STATE_SOCKET"] = SHARED_STATE_SOCKET
+    # HASH_WORKERS=0 (as in .env.example) means "all cores", which every worker would claim
+    if int(os.getenv("HASH_WORKERS") or "0") <= 0:
+        os.environ["HASH_WORKERS"] = str(max(1, (os.cpu_count() or 1) // WEB_WORKERS))
+
+    broker = BrokerThread(SHARED_STATE_SOCKET)
+
+    def on_starting(server):
+        broker.start()
+        broker.ready.wait()
+        server.log.info("Shared state broker listening on %s", SHARED_STATE_SOCKET)
+
+    def on_exit(server):
+        broker.stop()
+
+    class Application(BaseApplication):
+        def load_config(self):
+            settings = {
+                "bind": f"{HOST}:{PORT}",
+                "workers": WEB_WORKERS,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "graceful_timeout": GRACEFUL_TIMEOUT,
+                "on_starting": on_starting,
+                "on_exit": on_exit,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    Application().run()
+
+if __name__ == "__main__":
+    main()
@@ -53,11 +53,43 @@ def setup_database():
         );
         """
         
+        # Refresh tokens table (only a SHA-256 hash of each token is stored)
+        refresh_tokens_table = """
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+            token_hash VARCHAR(64) NOT NULL UNIQUE,
+            family_id UUID NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            used BOOLEAN DEFAULT FALSE,
+            revoked BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
+        """
+        
+        # Access token revocations (jti set: one token; jti null: every token
+        # of the email issued at or before revoked_before)
+        token_revocations_table = """
+        CREATE TABLE IF NOT EXISTS token_revocations (
+            id BIGSERIAL PRIMARY KEY,
+            jti VARCHAR(64),
+            email VARCHAR(255),
+            revoked_before TIMESTAMP WITH TIME ZONE,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
+        """
+        
         # Create indexes
         indexes = [
             "CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);",
+            "CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at, id);",
             "CREATE INDEX IF NOT EXISTS idx_password_resets_token ON password_resets(token);",
-            "CREATE INDEX IF NOT EXISTS idx_password_resets_email ON password_resets(email);"
+            "CREATE INDEX IF NOT EXISTS idx_password_resets_email ON password_resets(email);",
+            "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family_id ON refresh_tokens(family_id);",
+            "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_email ON refresh_tokens(email);",
+            "CREATE INDEX IF NOT EXISTS idx_token_revocations_expires_at ON token_revocations(expires_at);",
+            "CREATE INDEX IF NOT EXISTS idx_token_revocations_created_at ON token_revocations(created_at);"
         ]
         
         # Create update function
@@ -87,6 +119,12 @@ def setup_database():
         cursor.execute(password_resets_table)
         print("✅ Password resets table created/verified")
         
+        cursor.execute(refresh_tokens_table)
+        print("✅ Refresh tokens table created/verified")
+        
+        cursor.execute(token_revocations_table)
+        print("✅ Token revocations table created/verified")
+        
         for index in indexes:
             cursor.execute(index)
         print("✅ Indexes created/verified")
@@ -106,7 +144,7 @@ def setup_database():
             SELECT table_name 
             FROM information_schema.tables 
             WHERE table_schema = 'public' 
-            AND table_name IN ('users', 'password_resets');
+            AND table_name IN ('users', 'password_resets', 'refresh_tokens', 'token_revocations');
         """)
         
         tables = cursor.fetchall()
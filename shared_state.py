@@ -0,0 +1,146 @@
+"""
+State shared between worker processes.
+
+With several workers, rate-limit counters, token revocations and user cache
+invalidations must be seen by every process. serve.py runs a Broker (broker.py)
+in the master process on a unix socket and passes its path to the workers in
+SHARED_STATE_SOCKET. Each worker keeps one connection open through `client`
+and uses it to:
+
+- make requests the broker answers from its own state (rate-limit hits)
+- publish events the broker fans out to every other worker (revocations,
+  cache invalidations), delivered to handlers registered with subscribe()
+- push metrics snapshots, so any worker can answer a scrape for all of them
+
+Messages are JSON lines. Without SHARED_STATE_SOCKET, or while the broker is
+unreachable, callers fall back to their per-process state.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from broker import STREAM_LIMIT, encode
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_SOCKET = os.getenv("SHARED_STATE_SOCKET", "")
+REQUEST_TIMEOUT_SECONDS = 0.5
+RECONNECT_DELAY_SECONDS = 1.0
+
+class SharedStateClient:
+    """A worker's connection to the broker."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._handlers: Dict[str, List[Callable[[object], None]]] = {}
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def subscribe(self, channel: str, handler: Callable[[object], None]):
+        """Call `handler(data)` for every event other workers publish on `channel`."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self):
+        """Connect to the broker and keep the connection up in the background."""
+        if not self.path or self._worker is not None:
+            return
+        await self._connect()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        self._disconnect()
+
+    async def _connect(self):
+        try:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=STREAM_LIMIT)
+        except OSError as e:
+            logger.warning("Shared state broker unavailable at %s: %s", self.path, e)
+            self._reader = self._writer = None
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Shared state broker disconnected"))
+        self._pending.clear()
+
+    async def _run(self):
+        while True:
+            if not self.connected:
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+                await self._connect()
+                continue
+            try:
+                line = await self._reader.readline()
+            except ConnectionError:
+                line = b""
+            if not line:
+                logger.warning("Lost connection to shared state broker")
+                self._disconnect()
+                continue
+            self._dispatch(json.loads(line))
+
+    def _dispatch(self, message: dict):
+        if "id" in message:
+            future = self._pending.pop(message["id"], None)
+            if future is not None and not future.done():
+                future.set_result(message["result"])
+            return
+        for handler in self._handlers.get(message["channel"], ()):
+            try:
+                handler(message["data"])
+            except Exception:
+                logger.exception("Error handling shared state event on %s", message["channel"])
+
+    async def request(self, op: str, **fields):
+        """Send a request to the broker and return its result; raises ConnectionError when down."""
+        if not self.connected:
+            raise ConnectionError("Shared state broker is not connected")
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode({"id": request_id, "op": op, **fields}))
+        try:
+            return await asyncio.wait_for(future, REQUEST_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise ConnectionError("Shared state broker did not answer")
+        finally:
+            self._pending.pop(request_id, None)
+
+    def send(self, op: str, **fields):
+        """Send a message that gets no answer; dropped if the broker is down."""
+        if self.connected:
+            self._writer.write(encode({"op": op, **fields}))
+
+    def publish(self, channel: str, data):
+        """Send an event to every other worker; dropped if the broker is down."""
+        self.send("publish", channel=channel, data=data)
+
+def enabled() -> bool:
+    return bool(SHARED_STATE_SOCKET)
+
+client = SharedStateClient(SHARED_STATE_SOCKET)
@@ -0,0 +1,55 @@
+"""
+Request coalescing.
+
+SingleFlight lets concurrent callers asking for the same key share one
+in-flight backend call, along with its result or exception.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executions = 0
+        self.collapsed = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args):
+        """
+        Await `func(*args)`, or join the call already running for `key`.
+
+        The shared call runs as its own task and is shielded, so a caller
+        being cancelled does not cancel the work other callers are waiting on.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        """Make later callers start a fresh call instead of joining the current one."""
+        self._calls.pop(key, None)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away.
+            task.exception()
+
+    def stats(self) -> dict:
+        """Return execution and collapse counters."""
+        total = self.executions + self.collapsed
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "collapse_ratio": self.collapsed / total if total else 0.0,
+        }
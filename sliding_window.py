@@ -0,0 +1,64 @@
+"""
+Sliding window counters.
+
+Each key keeps the counts of the current and previous fixed windows, and the
+previous one is weighted by how much of it still overlaps the sliding window.
+That is O(1) memory per key. Keys are held in LRU order, capped at
+`max_keys`, and dropped once idle for two windows.
+
+This module only uses the standard library because the shared state broker
+imports it in the serve.py master process. Anything the master imports is
+inherited by every worker and never reloaded on SIGHUP.
+"""
+import time
+from collections import OrderedDict
+
+def estimate(previous: int, current: int, elapsed: float, window: int) -> float:
+    return previous * (1 - elapsed / window) + current
+
+def retry_after(previous: int, current: int, elapsed: float, limit: int, window: int) -> float:
+    """Seconds until one more request fits under the limit."""
+    if current + 1 > limit or not previous:
+        return window - elapsed
+    # previous * (1 - t / window) + current + 1 <= limit
+    return window * (1 - (limit - 1 - current) / previous) - elapsed
+
+class MemoryBackend:
+    """Per-process sliding window counters."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> [window start, window seconds, previous count, current count]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: int) -> float:
+        """Count a request; returns 0 if allowed, else seconds to wait."""
+        now = time.time()
+        window_start = now - now % window
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [window_start, window, 0, 0]
+        else:
+            self._entries.move_to_end(key)
+            if entry[0] != window_start:
+                entry[2] = entry[3] if entry[0] == window_start - window else 0
+                entry[3] = 0
+                entry[0] = window_start
+
+        elapsed = now - window_start
+        if estimate(entry[2], entry[3], elapsed, window) + 1 > limit:
+            return max(retry_after(entry[2], entry[3], elapsed, limit, window), 1)
+        entry[3] += 1
+        self._prune(now)
+        return 0
+
+    def _prune(self, now: float):
+        # Least recently used first: drop idle keys, then any over capacity
+        while self._entries:
+            key, (window_start, window, _, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_keys and now - window_start < 2 * window:
+                break
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
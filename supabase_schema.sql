@@ -20,10 +20,38 @@ CREATE TABLE password_resets (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Refresh tokens table (only a SHA-256 hash of each token is stored)
+CREATE TABLE refresh_tokens (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    token_hash VARCHAR(64) NOT NULL UNIQUE,
+    family_id UUID NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    used BOOLEAN DEFAULT FALSE,
+    revoked BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create access token revocations table (jti set: one token; jti null: every token
+-- of the email issued at or before revoked_before)
+CREATE TABLE token_revocations (
+    id BIGSERIAL PRIMARY KEY,
+    jti VARCHAR(64),
+    email VARCHAR(255),
+    revoked_before TIMESTAMP WITH TIME ZONE,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Indexes for better performance
 CREATE INDEX idx_users_email ON users(email);
+CREATE INDEX idx_users_created_at_id ON users(created_at, id);
 CREATE INDEX idx_password_resets_token ON password_resets(token);
 CREATE INDEX idx_password_resets_email ON password_resets(email);
+CREATE INDEX idx_refresh_tokens_family_id ON refresh_tokens(family_id);
+CREATE INDEX idx_refresh_tokens_email ON refresh_tokens(email);
+CREATE INDEX idx_token_revocations_expires_at ON token_revocations(expires_at);
+CREATE INDEX idx_token_revocations_created_at ON token_revocations(created_at);
 
 -- Function to automatically update the updated_at column
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -42,3 +70,5 @@ CREATE TRIGGER update_users_updated_at
 
 -- Clean up expired reset tokens (run this periodically)
 -- DELETE FROM password_resets WHERE expires_at < NOW();
+-- DELETE FROM refresh_tokens WHERE expires_at < NOW();
+-- DELETE FROM token_revocations WHERE expires_at < NOW();
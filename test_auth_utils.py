@@ -0,0 +1,74 @@
+"""
+Tests for the user cache against the in-process PostgREST stub.
+
+Requires pytest:
+
+    pip install pytest
+    python -m pytest test_auth_utils.py
+"""
+import asyncio
+import os
+
+# The app reads its configuration at import time
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.stub")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-not-for-production")
+os.environ.setdefault("HASH_EXECUTOR", "thread")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx
+import pytest
+
+import auth_utils
+import database
+from benchmarks.postgrest_stub import PostgRESTStub
+
+EMAIL = "user@example.com"
+
+class OverlappingStub(PostgRESTStub):
+    """Slow writes, and reads that answer from a snapshot taken before they wait."""
+
+    def __init__(self, write_delay: float, read_delay: float):
+        super().__init__()
+        self.write_delay = write_delay
+        self.read_delay = read_delay
+        self.write_started = asyncio.Event()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "PATCH":
+            self.write_started.set()
+            await asyncio.sleep(self.write_delay)
+            return await super().handle_async_request(request)
+        response = await super().handle_async_request(request)
+        if request.method == "GET":
+            await asyncio.sleep(self.read_delay)
+        return response
+
+@pytest.fixture
+def stub():
+    stub = OverlappingStub(write_delay=0.1, read_delay=0.3)
+    database.use_transport(stub)
+    auth_utils.user_cache.clear()
+    yield stub
+    database.use_transport(None)
+    auth_utils.user_cache.clear()
+
+def test_read_overlapping_password_change_does_not_cache_old_hash(stub):
+    async def scenario():
+        old_hash = await auth_utils.get_password_hash("old-password")
+        stub.seed("users", [auth_utils.new_user_row(EMAIL, old_hash, "Test", "User")])
+
+        update = asyncio.create_task(auth_utils.update_user_password(EMAIL, "new-password"))
+        await stub.write_started.wait()
+        # Reads the row before the update commits and returns after it
+        lookup = asyncio.create_task(auth_utils.get_user_by_email(EMAIL))
+        updated = await update
+        await lookup
+
+        assert updated["password_hash"] != old_hash
+        assert auth_utils.user_cache.get(EMAIL)["password_hash"] == updated["password_hash"]
+        assert await auth_utils.authenticate_user(EMAIL, "old-password") is False
+        assert await auth_utils.authenticate_user(EMAIL, "new-password")
+        await database.close_client()
+
+    asyncio.run(scenario())
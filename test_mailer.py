@@ -0,0 +1,135 @@
+"""
+Tests for the email outbox against a local SMTP server.
+
+Requires pytest and aiosmtpd:
+
+    pip install pytest aiosmtpd
+    python -m pytest test_mailer.py
+"""
+import asyncio
+import socket
+import time
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import mailer
+
+class Recorder:
+    """aiosmtpd handler recording deliveries and answering RCPT from a script."""
+
+    def __init__(self, rcpt_replies=None):
+        # address -> replies to give in turn, then "250 OK"
+        self.rcpt_replies = rcpt_replies or {}
+        self.delivered = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        replies = self.rcpt_replies.get(address)
+        if replies:
+            return replies.pop(0)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def smtp_settings(monkeypatch):
+    port = free_port()
+    monkeypatch.setattr(mailer, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(mailer, "SMTP_PORT", port)
+    monkeypatch.setattr(mailer, "SMTP_FROM", "noreply@example.com")
+    monkeypatch.setattr(mailer, "SMTP_USER", None)
+    monkeypatch.setattr(mailer, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(mailer, "SMTP_TIMEOUT", 2)
+    monkeypatch.setattr(mailer, "SMTP_RETRY_BASE_DELAY", 0.05)
+    return port
+
+@pytest.fixture
+def smtp_server(smtp_settings):
+    servers = []
+
+    def start(handler: Recorder) -> Recorder:
+        controller = Controller(handler, hostname="127.0.0.1", port=smtp_settings)
+        controller.start()
+        servers.append(controller)
+        return handler
+
+    yield start
+    for controller in servers:
+        controller.stop()
+
+async def deliver(recipients, settle: float = 0.5) -> mailer.EmailOutbox:
+    """Queue one message per recipient before the worker runs, then wait for delivery."""
+    outbox = mailer.EmailOutbox()
+    outbox.start()
+    for to in recipients:
+        assert outbox.enqueue(to, "Subject", "Body")
+    await asyncio.sleep(settle)
+    await outbox.stop()
+    return outbox
+
+def test_batch_is_delivered_over_one_connection(smtp_server):
+    server = smtp_server(Recorder())
+    recipients = [f"user{i}@example.com" for i in range(5)]
+
+    outbox = asyncio.run(deliver(recipients))
+
+    assert sorted(server.delivered) == recipients
+    assert len(server.sessions) == 1
+    stats = outbox.stats()
+    assert stats["sent"] == 5
+    assert stats["batches"] == 1
+    assert stats["connections"] == 1
+    assert stats["failed"] == stats["retried"] == 0
+
+def test_transient_rejection_is_retried(smtp_server):
+    server = smtp_server(Recorder({"busy@example.com": ["451 4.3.0 Try again later"]}))
+
+    outbox = asyncio.run(deliver(["busy@example.com", "ok@example.com"]))
+
+    assert sorted(server.delivered) == ["busy@example.com", "ok@example.com"]
+    stats = outbox.stats()
+    assert stats["sent"] == 2
+    assert stats["retried"] == 1
+    assert stats["failed"] == 0
+    assert stats["connections"] == 1
+
+def test_permanent_rejection_is_not_retried(smtp_server):
+    server = smtp_server(Recorder({"gone@example.com": ["550 5.1.1 No such user"]}))
+
+    outbox = asyncio.run(deliver(["gone@example.com", "ok@example.com"]))
+
+    assert server.delivered == ["ok@example.com"]
+    stats = outbox.stats()
+    assert stats["sent"] == 1
+    assert stats["failed"] == 1
+    assert stats["retried"] == 0
+
+def test_connect_failure_fails_batch_once(smtp_settings, monkeypatch):
+    attempts = []
+    connect = mailer.SMTPConnection._connect
+
+    def counting_connect(self):
+        attempts.append(time.monotonic())
+        connect(self)
+
+    monkeypatch.setattr(mailer.SMTPConnection, "_connect", counting_connect)
+    outbox = mailer.EmailOutbox()
+    batch = [mailer.OutgoingEmail(f"user{i}@example.com", "Subject", "Body") for i in range(3)]
+
+    # No server is listening on the port
+    failures = outbox._send_batch(batch)
+
+    assert len(attempts) == 1
+    assert [message for message, _ in failures] == batch
+    assert all(isinstance(error, ConnectionError) for _, error in failures)
+    assert not any(mailer._is_permanent(error) for _, error in failures)
@@ -0,0 +1,235 @@
+"""
+Bulk user import and export.
+
+Records are streamed from NDJSON or CSV, validated, hashed in parallel across
+the hashing pool and written in batches. Hashing of the next batch overlaps
+with the insert of the previous one. Each record needs `email`, `first_name`,
+`last_name` and either `password` (hashed here) or `password_hash` (an
+existing hash in a configured scheme, stored verbatim); `is_verified` is
+optional.
+
+Inserts skip emails that already exist, so re-running an import, or resuming
+one from a checkpoint, is safe.
+
+Exports stream users as NDJSON using keyset pagination on (created_at, id),
+holding at most two pages in memory regardless of table size.
+"""
+import asyncio
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from email_validator import EmailNotValidError, validate_email
+
+import hashing
+import repository
+from auth_utils import new_user_row
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FIRST_PAGE_SIZE = 100
+MAX_REPORTED_ERRORS = 100
+
+@dataclass
+class ImportProgress:
+    processed: int = 0
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    last_line: int = 0
+    aborted: Optional[str] = None
+    started_at: float = field(default_factory=time.monotonic)
+    errors: List[dict] = field(default_factory=list)
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def record_error(self, line: int, reason: str, count: int = 1):
+        self.failed += count
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    def summary(self) -> dict:
+        return {
+            "processed": self.processed,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last_line": self.last_line,
+            "aborted": self.aborted,
+            "errors": self.errors,
+        }
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of byte chunks into decoded lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+async def parse_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Yield (line number, record) pairs from NDJSON or CSV lines.
+
+    A record that cannot be parsed is yielded as the error string instead of
+    a dict. CSV input must start with a header row and may not contain
+    quoted newlines.
+    """
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            row = next(csv.reader([line]))
+            if header is None:
+                header = [column.strip() for column in row]
+                continue
+            yield line_number, dict(zip(header, row))
+        else:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            yield line_number, record if isinstance(record, dict) else "Expected a JSON object"
+
+def _validate(record: dict) -> Tuple[Optional[dict], Optional[str]]:
+    """Return (normalised record, None) or (None, reason)."""
+    try:
+        email = validate_email(str(record.get("email", "")), check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        return None, f"Invalid email: {e}"
+    first_name = record.get("first_name")
+    last_name = record.get("last_name")
+    if not first_name or not last_name:
+        return None, "first_name and last_name are required"
+
+    password_hash = record.get("password_hash")
+    if password_hash and not hashing.is_password_hash(password_hash):
+        return None, "password_hash is not in a supported scheme"
+    if not password_hash and not record.get("password"):
+        return None, "password or password_hash is required"
+
+    is_verified = record.get("is_verified", False)
+    if isinstance(is_verified, str):
+        is_verified = is_verified.strip().lower() in ("1", "true", "yes")
+    return {
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "password": record.get("password"),
+        "password_hash": password_hash,
+        "is_verified": bool(is_verified),
+    }, None
+
+async def _prepare_batch(batch: List[dict]) -> List[dict]:
+    """Hash the plaintext passwords of a batch in parallel and build user rows."""
+    plaintext = [record for record in batch if not record["password_hash"]]
+    hashes = await hashing.hash_passwords([record["password"] for record in plaintext])
+    for record, password_hash in zip(plaintext, hashes):
+        record["password_hash"] = password_hash
+    return [
+        new_user_row(
+            record["email"], record["password_hash"], record["first_name"],
+            record["last_name"], record["is_verified"],
+        )
+        for record in batch
+    ]
+
+async def import_users(records: AsyncIterator[Tuple[int, object]],
+                       batch_size: int = IMPORT_BATCH_SIZE,
+                       skip_until_line: int = 0,
+                       on_batch: Optional[Callable[[ImportProgress], None]] = None) -> ImportProgress:
+    """
+    Import parsed records in batches and return the final progress.
+
+    Records at or before `skip_until_line` are ignored, which is how an
+    interrupted import resumes. `on_batch` is called after every batch is
+    written; `progress.last_line` is then safe to checkpoint. If a batch
+    cannot be written the import stops, leaving `last_line` at the last
+    batch that was, and `progress.aborted` says why.
+    """
+    progress = ImportProgress()
+    pending_insert: Optional[asyncio.Task] = None
+
+    async def write(rows: List[dict], count: int, last_line: int):
+        inserted = await repository.insert_users(rows) if rows else 0
+        progress.imported += inserted
+        progress.skipped += len(rows) - inserted
+        progress.processed += count
+        progress.last_line = last_line
+        if on_batch:
+            on_batch(progress)
+
+    async def flush(batch: List[dict], count: int, last_line: int):
+        nonlocal pending_insert
+        rows = await _prepare_batch(batch)
+        if pending_insert:
+            await pending_insert
+        pending_insert = asyncio.create_task(write(rows, count, last_line))
+
+    batch: List[dict] = []
+    count = 0
+    last_line = skip_until_line
+    try:
+        async for line_number, record in records:
+            if line_number <= skip_until_line:
+                continue
+            last_line = line_number
+            count += 1
+            if isinstance(record, str):
+                progress.record_error(line_number, record)
+            else:
+                validated, error = _validate(record)
+                if error:
+                    progress.record_error(line_number, error)
+                else:
+                    batch.append(validated)
+            if len(batch) >= batch_size:
+                await flush(batch, count, last_line)
+                batch, count = [], 0
+
+        if batch or count:
+            await flush(batch, count, last_line)
+        if pending_insert:
+            await pending_insert
+    except Exception as e:
+        if pending_insert and not pending_insert.done():
+            pending_insert.cancel()
+        progress.aborted = str(e) or type(e).__name__
+    return progress
+
+async def export_users(page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[bytes]:
+    """
+    Yield every user as an NDJSON line, oldest first.
+
+    The first page is small so output starts right away, and each following
+    page is fetched while the current one is being written out.
+    """
+    limit = min(EXPORT_FIRST_PAGE_SIZE, page_size)
+    next_page = asyncio.ensure_future(repository.fetch_users_page(limit))
+    try:
+        while next_page is not None:
+            page = await next_page
+            next_page = None
+            if len(page) == limit:
+                last = page[-1]
+                limit = page_size
+                next_page = asyncio.ensure_future(
+                    repository.fetch_users_page(limit, (last["created_at"], last["id"]))
+                )
+            for user in page:
+                yield (json.dumps(user, separators=(",", ":")) + "\n").encode()
+    finally:
+        if next_page is not None:
+            next_page.cancel()